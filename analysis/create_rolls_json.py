@@ -1,75 +1,102 @@
+import base64
 import json
 import datetime
-import csv
 import random
 
+import numpy as np
+
+from qless_difficulty import difficulty_bands, load_difficulty
+from qless_lexicon import load_lexicon
 
-FIRST_DAY = datetime.date(2026, 1, 8) # + datetime.timedelta(7 * 24)
 
+FIRST_DAY = datetime.date(2026, 1, 8) # + datetime.timedelta(7 * 24)
+THRESHOLD = 3  # minimum realness of words that count as legal
+COMPACT = False  # if true, write the compact format (see `compact` below)
+BY_DIFFICULTY = False  # if true, pool all the candidates and give each day of
+                       # the week a band of difficulty (scored by
+                       # qless_difficulty.py) instead of its own list
+DAYS_BY_DIFFICULTY = ["monday", "tuesday", "wednesday", "thursday", "friday",
+                      "saturday", "sunday"]  # easiest first
 
-definitions = {}
-realness = {}
 
 with open("analysis/candidates.json") as f:
     candidates = json.load(f)
 
-with open("analysis/ratings.csv") as f:
-    reader = csv.reader(f, delimiter=",", quotechar="\"")
-    for row in reader:
-        realness[row[0]] = int(row[1])
-
-with open("analysis/wordlist1.txt") as f:
-    for line in f.readlines():
-        if "\t" in line:
-            [word, definition] = line.split("\t", 1)
-            word = word.lower()
-            definition = definition.strip()
-            if 3 <= len(word) <= 12:
-                if word not in realness:
-                    realness[word] = 5
-
-with open("analysis/wordlist2.txt") as f:
-    for line in f.readlines():
-        if " " in line:
-            [word, definition] = line.split(" ", 1)
-            word = word.lower()
-            definition = definition.strip()
-            definitions[word] = definition
-            if 3 <= len(word) <= 12:
-                if word not in realness:
-                    realness[word] = 5
-
-
-def is_possible(word, letters):
-    if len(word) < 3:
-        return False
-    for letter in "abcdefghijklmnopqrstuvwxyz":
-        if word.count(letter) > letters.count(letter):
-            return False
-    return True
-
-
-def get_possible(letters, threshold=3):
-    return [
-        word for word in realness
-        if (realness[word] >= threshold) and is_possible(word, letters)
-    ]
+lexicon = load_lexicon()
+
+if BY_DIFFICULTY:
+    difficulty = load_difficulty()
+    pool = list(dict.fromkeys(roll for day in candidates.values() for roll in day))
+    unscored = [roll for roll in pool if roll not in difficulty]
+    if len(unscored) > 0:
+        raise ValueError(f"{len(unscored)} candidates have no difficulty score; "
+                         "run qless_difficulty.py first")
+    bands = difficulty_bands(pool, difficulty, len(DAYS_BY_DIFFICULTY))
+    candidates = dict(zip(DAYS_BY_DIFFICULTY, bands))
+
+
+def encode_indices(indices):
+    """
+    Encode increasing `indices` compactly: each is written as its gap from the
+    previous one (the first as itself) in 7-bit groups, low group first, with
+    the high bit of each byte set if more groups follow, then base64-encoded.
+    """
+    encoded = bytearray()
+    previous = 0
+    for i in indices:
+        gap = int(i) - previous
+        previous = int(i)
+        while gap >= 0x80:
+            encoded.append((gap & 0x7f) | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+    return base64.b64encode(bytes(encoded)).decode()
+
+
+def compact(days, legal_ids):
+    """
+    Build the compact rolls.json format: a shared table of every legal word
+    (in lexicon order), and for each day, the indices of its legal words in
+    that table, encoded by `encode_indices`. Decoded in order, that gives
+    back the same lists.
+    """
+    used = np.unique(np.concatenate(legal_ids)) if len(legal_ids) > 0 else np.array([], dtype=int)
+    rolls_json = {
+        "words": [lexicon.words[i] for i in used],
+        "days": {}
+    }
+    for (date, roll), ids in zip(days, legal_ids):
+        rolls_json["days"][date] = {
+            "roll": roll,
+            "legalWords": encode_indices(np.searchsorted(used, ids))
+        }
+    return rolls_json
 
 
 current_date = FIRST_DAY
-rolls_json = {}
+days = []
 
 while True:
     day_of_week = current_date.strftime('%A').lower()
     if len(candidates[day_of_week]) == 0:
         break
     roll = candidates[day_of_week].pop(0)
-    legal_words = get_possible(roll)
-    rolls_json[current_date.strftime("%Y%m%d")] = {
-        "roll": roll,
-        "legalWords": legal_words
-    }
+    days.append((current_date.strftime("%Y%m%d"), roll))
     current_date += datetime.timedelta(1)
 
+# Find the legal words for every day's roll at once.
+legal_ids = lexicon.possible_ids_batch([roll for _, roll in days], THRESHOLD)
+
+if COMPACT:
+    rolls_json = compact(days, legal_ids)
+else:
+    rolls_json = {
+        date: {
+            "roll": roll,
+            "legalWords": [lexicon.words[i] for i in ids]
+        }
+        for (date, roll), ids in zip(days, legal_ids)
+    }
+
 with open("analysis/rolls.json", "w") as f:
     json.dump(rolls_json, f)
@@ -1,23 +1,13 @@
-import pandas as pd
-import numpy as np
 import xgboost as xgb
 from sklearn.linear_model import LinearRegression
 
-csv_path = "src/lib/test/mayhem-manager/duel-sample-large.csv"
+from mm_samples import duels_by_fighter, load_duel_csv
 
-df = pd.read_csv(csv_path, header="infer")
-num_columns_per_fighter = int((len(df.columns) - 1) / 12)
-colnames = [n[6:] for n in df.columns[1:num_columns_per_fighter + 1]]
-num_matches = len(df)
+csv_path = "src/lib/test/mayhem-manager/duel-sample-large.csv"
 
-matrix = np.array(df)
-wide_x = matrix[:, 1:]
-x = np.zeros(shape=(num_matches * 12, num_columns_per_fighter))
-for i in range(12):
-    x[i * num_matches:(i + 1) * num_matches, :] = wide_x[:, i * num_columns_per_fighter:(i + 1) * num_columns_per_fighter]
-y = matrix[:, 0]
-y = np.resize(y, len(y) * 12)
-y[int(len(y) / 2):] = -y[int(len(y) / 2):]
+# One row per fighter per duel, with the result for that fighter's team.
+results, fighters, colnames = load_duel_csv(csv_path)
+x, y = duels_by_fighter(results, fighters)
 
 lm = LinearRegression()
 lm.fit(x, y)
@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+
+FIT_PATH = "analysis/mm-fit.npz"
+
+
+class NormalEquations:
+    """
+    A least squares fit that rows can be added to a batch at a time, by
+    keeping the normal equations (X^T X and X^T y) instead of the rows, along
+    with the sums needed for the column means and the standard deviation of
+    y. Columns are identified by name, so batches with different columns
+    (like a batch where some piece of equipment never came up) line up, and a
+    column that's new gets added as all zeros in the earlier rows.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+        self.xtx = np.zeros((0, 0))
+        self.xty = np.zeros(0)
+        self.x_sum = np.zeros(0)
+        self.rows = 0
+        self.y_sum = 0.0
+        self.yty = 0.0
+
+    def _columns(self, names):
+        """Get the positions of the columns `names`, adding any that are new."""
+        new = [name for name in names if name not in self.index]
+        if len(new) > 0:
+            for name in new:
+                self.index[name] = len(self.names)
+                self.names.append(name)
+            extra = len(new)
+            self.xtx = np.pad(self.xtx, ((0, extra), (0, extra)))
+            self.xty = np.pad(self.xty, (0, extra))
+            self.x_sum = np.pad(self.x_sum, (0, extra))
+        return np.array([self.index[name] for name in names], dtype=np.int64)
+
+    def add(self, x, y, names):
+        """Add the rows of `x` (with columns `names`) and their values `y`."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float).reshape(-1)
+        columns = self._columns(names)
+        self.xtx[np.ix_(columns, columns)] += x.T @ x
+        self.xty[columns] += x.T @ y
+        self.x_sum[columns] += x.sum(axis=0)
+        self.rows += len(y)
+        self.y_sum += float(y.sum())
+        self.yty += float(y @ y)
+
+    def merge(self, other):
+        """Add all the rows that have been added to `other`."""
+        columns = self._columns(other.names)
+        self.xtx[np.ix_(columns, columns)] += other.xtx
+        self.xty[columns] += other.xty
+        self.x_sum[columns] += other.x_sum
+        self.rows += other.rows
+        self.y_sum += other.y_sum
+        self.yty += other.yty
+
+    def means(self):
+        """Get the mean of each column."""
+        return self.x_sum / max(self.rows, 1)
+
+    def y_std(self):
+        """Get the (population) standard deviation of y."""
+        mean = self.y_sum / max(self.rows, 1)
+        return np.sqrt(max(self.yty / max(self.rows, 1) - mean ** 2, 0))
+
+    def solve(self, normalize=True, ridge=0.0):
+        """
+        Get the coefficient of each column. With no `ridge`, the same as
+        `np.linalg.lstsq` on all the rows, including when some columns are
+        redundant. If `normalize` is true, y is scaled to a standard deviation
+        of 1 first.
+
+        Solving from X^T X squares the condition number of X, so with columns
+        that are nearly (but not exactly) redundant, rounding error can swamp
+        the solution. `ridge` adds that fraction of the average diagonal entry
+        to the diagonal (ridge regression), which keeps the condition number
+        below about 1 / `ridge`.
+        """
+        xtx = self.xtx
+        if ridge > 0 and len(xtx) > 0:
+            xtx = xtx + ridge * np.mean(np.diag(xtx)) * np.eye(len(xtx))
+        solution = np.linalg.lstsq(xtx, self.xty, rcond=None)[0]
+        if normalize:
+            solution = solution / self.y_std()
+        return solution
+
+
+def save_fits(fits, path=FIT_PATH):
+    """Save the fits in the dict `fits`, so more rows can be added later."""
+    arrays = {}
+    for key, fit in fits.items():
+        arrays[f"{key}.names"] = np.array(fit.names, dtype=str)
+        arrays[f"{key}.xtx"] = fit.xtx
+        arrays[f"{key}.xty"] = fit.xty
+        arrays[f"{key}.x_sum"] = fit.x_sum
+        arrays[f"{key}.totals"] = np.array([fit.rows, fit.y_sum, fit.yty])
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def load_fits(path=FIT_PATH):
+    """Load the fits saved by `save_fits`, or an empty dict if there are none."""
+    if not os.path.exists(path):
+        return {}
+    fits = {}
+    with np.load(path) as arrays:
+        for key in {name.rsplit(".", 1)[0] for name in arrays.files}:
+            fit = NormalEquations()
+            fit._columns(arrays[f"{key}.names"].tolist())
+            fit.xtx = arrays[f"{key}.xtx"]
+            fit.xty = arrays[f"{key}.xty"]
+            fit.x_sum = arrays[f"{key}.x_sum"]
+            rows, fit.y_sum, fit.yty = arrays[f"{key}.totals"].tolist()
+            fit.rows = int(rows)
+            fits[key] = fit
+    return fits
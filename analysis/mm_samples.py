@@ -0,0 +1,358 @@
+import itertools
+import json
+import os
+
+import numpy as np
+
+FIGHT_SAMPLE_PATH = "src/lib/test/mayhem-manager/fight-sample.json"
+DUEL_CSV_PATH = "src/lib/test/mayhem-manager/duel-sample-large.csv"
+STAT_NAMES = ["strength", "accuracy", "energy", "speed", "toughness"]
+
+# How many characters of the sample file to read at a time.
+READ_SIZE = 1 << 20
+# How many fights iter_fight_features builds the matrices of at a time.
+CHUNK_FIGHTS = 100000
+# How many rows of the duel CSV to parse at a time.
+CHUNK_ROWS = 50000
+# Each row of the duel CSV has the result, then the same columns for each of
+# the fighters, the first half on the team the result is for.
+DUEL_FIGHTERS = 12
+
+
+def iter_fights(path=FIGHT_SAMPLE_PATH):
+    """
+    Yield the fights in a fight sample file one at a time, reading it a chunk
+    at a time instead of loading it all. The file can be a JSON array of
+    fights (as written by sim-test-fight.ts) or have one fight per line.
+    """
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buffer = ""
+        position = 0
+        done = False
+        while True:
+            # Skip whatever separates fights: whitespace, commas and brackets.
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                position += 1
+            if position == len(buffer):
+                if done:
+                    return
+                buffer = f.read(READ_SIZE)
+                position = 0
+                done = len(buffer) == 0
+                continue
+            try:
+                fight, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The fight runs past the end of the buffer, so read more.
+                chunk = f.read(READ_SIZE)
+                if len(chunk) == 0:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield fight
+            position = end
+
+
+class GrowableArray:
+    """
+    A 2D array that rows can be added to. The rows are kept in a preallocated
+    array that doubles in size when it fills up, so adding a row is amortized
+    constant time and there's never a list of rows to convert.
+    """
+
+    def __init__(self, columns, dtype=float, capacity=1024):
+        self.data = np.zeros((capacity, columns), dtype=dtype)
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, row):
+        """Add a row. If it is shorter than the array is wide, the rest are 0."""
+        if self.rows == len(self.data):
+            grown = np.zeros((2 * len(self.data), self.data.shape[1]), dtype=self.data.dtype)
+            grown[:self.rows] = self.data[:self.rows]
+            self.data = grown
+        self.data[self.rows, :len(row)] = row
+        self.rows += 1
+        return self.rows - 1
+
+    def extend(self, rows):
+        """Add several rows at once."""
+        rows = np.asarray(rows, dtype=self.data.dtype).reshape(-1, self.data.shape[1])
+        needed = self.rows + len(rows)
+        if needed > len(self.data):
+            grown = np.zeros((max(needed, 2 * len(self.data)), self.data.shape[1]),
+                             dtype=self.data.dtype)
+            grown[:self.rows] = self.data[:self.rows]
+            self.data = grown
+        self.data[self.rows:needed] = rows
+        self.rows = needed
+
+    def array(self):
+        """Get the rows added so far (a view, not a copy)."""
+        return self.data[:self.rows]
+
+
+def round_like_python(values, digits):
+    """
+    Round each of `values` to `digits` decimal places, with exactly the same
+    result as Python's `round`. `np.round` scales, rounds and scales back,
+    which can land the other way from Python when a value is within rounding
+    error of halfway, so those few are rounded by Python.
+    """
+    rounded = np.round(values, digits)
+    scaled = np.abs(values) * 10 ** digits
+    close = np.nonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)[0]
+    for i in close:
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+def team_scores(team_fights, num_teams, hp, fighters, placement):
+    """
+    Score each team based on how well it performed in its fight, relative to
+    the average team in that fight. A team with fighters left scores the
+    number of teams plus the fraction of its fighters' HP left, and one
+    without scores the number of teams minus its place in the ordering.
+    `team_fights` is each team's fight, `num_teams` each fight's number of
+    teams, and the rest are per team.
+    """
+    teams_in_fight = num_teams[team_fights]
+    alive = hp > 0
+    scores = np.where(
+        alive,
+        teams_in_fight + hp / np.where(alive, fighters * 100, 1),
+        teams_in_fight - placement
+    )
+    mean = np.bincount(team_fights, scores, len(num_teams)) / np.maximum(num_teams, 1)
+    return round_like_python(scores - mean[team_fights], 3)
+
+
+class FightFeatures:
+    """
+    Features of every team in a fight sample. Each team has a row of its
+    number of fighters, the totals of each stat over its fighters, and how
+    many of each piece of equipment its first fighter has. Equipment gets a
+    column the first time it is seen (as an attunement or equipped), and the
+    columns are put in alphabetical order at the end.
+
+    Fights are only flattened as they're added, into a row per fighter, team
+    and equipped item, and the features and scores are computed all at once
+    from those by `matrices`.
+    """
+
+    def __init__(self):
+        self.equipment = {}
+        # Each fight's first team and number of teams, and the length of its
+        # ordering (which scores are averaged over).
+        self.fights = GrowableArray(3, dtype=np.int64)
+        # Each team's fight.
+        self.teams = GrowableArray(1, dtype=np.int64)
+        # Each team's place in its fight's ordering, as (team, place).
+        self.placements = GrowableArray(2, dtype=np.int64)
+        # Each fighter's team and HP left, then its stats.
+        self.fighters = GrowableArray(2 + len(STAT_NAMES))
+        # Each piece of equipment on the first fighter of a team, as
+        # (team, column).
+        self.equipped = GrowableArray(2, dtype=np.int64)
+
+    def _column(self, name):
+        """Get the column of a piece of equipment, adding one if it's new."""
+        if name not in self.equipment:
+            self.equipment[name] = 1 + len(STAT_NAMES) + len(self.equipment)
+        return self.equipment[name]
+
+    def add(self, fight):
+        """Add the teams of `fight`."""
+        first = len(self.teams)
+        self.fights.append([first, len(fight['teams']), len(fight['ordering'])])
+        self.teams.extend([len(self.fights) - 1] * len(fight['teams']))
+        self.placements.extend([[first + t, p] for p, t in enumerate(fight['ordering'])])
+        fighters = []
+        equipped = []
+        for t, team in enumerate(fight['teams']):
+            for fighter in team['fighters']:
+                for e in fighter['attunements']:
+                    self._column(e)
+                hp = max(fight['hp'][len(fighters)], 0)
+                stats = fighter['stats']
+                fighters.append([first + t, hp] + [stats.get(name, 0) for name in STAT_NAMES])
+            equipped += [[first + t, self._column(e)] for e in team['equipment'][0]]
+        self.fighters.extend(fighters)
+        self.equipped.extend(equipped)
+
+    def stat_names(self):
+        """Get the names of the stat and equipment columns, in order."""
+        return STAT_NAMES + sorted(self.equipment)
+
+    def duel_columns(self):
+        """Get the names of the columns of the duel matrix after the score."""
+        team = ["number of fighters"] + self.stat_names()
+        return ["base"] + team + ["opponent " + name for name in team]
+
+    def br_columns(self):
+        """Get the names of the columns of the battle royale matrix after the score."""
+        return ["base"] + self.stat_names()
+
+    def matrices(self):
+        """
+        Get the duel and battle royale matrices. Each duel has a row for each
+        of its two teams: its score, 1, its features, then its opponent's
+        features. Each battle royale has a row for each team: its score, 1,
+        then its features except its number of fighters.
+        """
+        fights = self.fights.array()
+        team_fights = self.teams.array()[:, 0]
+        fighters = self.fighters.array()
+        fighter_teams = fighters[:, 0].astype(np.int64)
+        num_teams = len(team_fights)
+
+        # Sort the equipment columns alphabetically.
+        position = np.empty(1 + len(STAT_NAMES) + len(self.equipment), dtype=np.int64)
+        position[:1 + len(STAT_NAMES)] = np.arange(1 + len(STAT_NAMES))
+        for i, name in enumerate(sorted(self.equipment)):
+            position[self.equipment[name]] = 1 + len(STAT_NAMES) + i
+
+        teams = np.zeros((num_teams, len(position)))
+        teams[:, 0] = np.bincount(fighter_teams, minlength=num_teams)
+        for i in range(len(STAT_NAMES)):
+            teams[:, 1 + i] = np.bincount(fighter_teams, fighters[:, 2 + i], num_teams)
+        equipped = self.equipped.array()
+        np.add.at(teams, (equipped[:, 0], position[equipped[:, 1]]), 1)
+
+        placement = np.zeros(num_teams)
+        placements = self.placements.array()
+        placement[placements[:, 0]] = placements[:, 1]
+        hp = np.bincount(fighter_teams, fighters[:, 1], num_teams)
+        scores = team_scores(team_fights, fights[:, 2], hp, teams[:, 0], placement)
+
+        width = teams.shape[1]
+        is_duel = fights[:, 1] == 2
+        firsts = fights[is_duel, 0]
+        duels = np.empty((2 * len(firsts), 2 + 2 * width))
+        for side in range(2):
+            us = firsts + side
+            them = firsts + 1 - side
+            duels[side::2, 0] = scores[us]
+            duels[side::2, 1] = 1
+            duels[side::2, 2:2 + width] = teams[us]
+            duels[side::2, 2 + width:] = teams[them]
+
+        rows = np.nonzero(~is_duel[team_fights])[0]
+        brs = np.empty((len(rows), 1 + width))
+        brs[:, 0] = scores[rows]
+        brs[:, 1] = 1
+        brs[:, 2:] = teams[rows, 1:]
+        return duels, brs
+
+
+def load_fight_features(path=FIGHT_SAMPLE_PATH):
+    """
+    Read a fight sample in one streaming pass, and get its duel and battle
+    royale matrices (see `FightFeatures.matrices`) and the names of the stat
+    and equipment columns.
+    """
+    features = FightFeatures()
+    for fight in iter_fights(path):
+        features.add(fight)
+    return (*features.matrices(), features.stat_names())
+
+
+def iter_fight_features(path=FIGHT_SAMPLE_PATH, chunk_fights=CHUNK_FIGHTS):
+    """
+    Read a fight sample in one streaming pass, yielding the features of
+    `chunk_fights` fights at a time (so only that many are ever in memory).
+    Each chunk is its duel matrix, its battle royale matrix, and the names of
+    their columns after the score (see `FightFeatures.duel_columns` and
+    `FightFeatures.br_columns`), which can differ between chunks when one has
+    equipment another doesn't.
+    """
+    features = FightFeatures()
+    for fight in iter_fights(path):
+        features.add(fight)
+        if len(features.fights) == chunk_fights:
+            yield (*features.matrices(), features.duel_columns(), features.br_columns())
+            features = FightFeatures()
+    if len(features.fights) > 0:
+        yield (*features.matrices(), features.duel_columns(), features.br_columns())
+
+
+def _duel_cache_paths(path):
+    base = os.path.splitext(path)[0]
+    return base + ".results.npy", base + ".fighters.npy"
+
+
+def load_duel_csv(path=DUEL_CSV_PATH, cache=True):
+    """
+    Load the duel CSV as float32 arrays: the result of each duel (one per
+    row) and the fighter columns, shaped (duels, fighters, columns per
+    fighter). It's parsed CHUNK_ROWS rows at a time straight into the arrays,
+    so there's never a copy of the whole file in any other form. Also returns
+    the names of the columns of one fighter.
+
+    If `cache` is true, the arrays are written to .npy files next to the CSV
+    as they're parsed, and later loads (until the CSV changes) memory-map
+    those instead of parsing again.
+    """
+    with open(path) as f:
+        header = f.readline().strip().split(",")
+    columns = (len(header) - 1) // DUEL_FIGHTERS
+    names = [n[6:] for n in header[1:columns + 1]]
+
+    results_path, fighters_path = _duel_cache_paths(path)
+    if cache and os.path.exists(fighters_path) \
+            and os.path.getmtime(fighters_path) >= os.path.getmtime(path):
+        return (np.load(results_path, mmap_mode="r"),
+                np.load(fighters_path, mmap_mode="r"), names)
+
+    with open(path) as f:
+        f.readline()
+        duels = sum(1 for line in f if len(line.strip()) > 0)
+    shape = (duels, DUEL_FIGHTERS, columns)
+    if cache:
+        results = np.lib.format.open_memmap(results_path + ".tmp", mode="w+",
+                                            dtype=np.float32, shape=(duels,))
+        fighters = np.lib.format.open_memmap(fighters_path + ".tmp", mode="w+",
+                                             dtype=np.float32, shape=shape)
+    else:
+        results = np.empty(duels, dtype=np.float32)
+        fighters = np.empty(shape, dtype=np.float32)
+
+    with open(path) as f:
+        f.readline()
+        lines = (line for line in f if len(line.strip()) > 0)
+        row = 0
+        while row < duels:
+            chunk = np.loadtxt(itertools.islice(lines, CHUNK_ROWS), delimiter=",",
+                               dtype=np.float32, ndmin=2)
+            if len(chunk) == 0:
+                break
+            results[row:row + len(chunk)] = chunk[:, 0]
+            fighters[row:row + len(chunk)] = chunk[:, 1:].reshape(-1, DUEL_FIGHTERS, columns)
+            row += len(chunk)
+
+    if cache:
+        results.flush()
+        fighters.flush()
+        del results, fighters
+        os.replace(results_path + ".tmp", results_path)
+        os.replace(fighters_path + ".tmp", fighters_path)
+        return (np.load(results_path, mmap_mode="r"),
+                np.load(fighters_path, mmap_mode="r"), names)
+    return results, fighters, names
+
+
+def duels_by_fighter(results, fighters):
+    """
+    Get the duel CSV in long format: a row of features per fighter per duel
+    (a view of `fighters`, not a copy), and the result for that fighter's team
+    (the duel's result for the first half of the fighters, and its negative
+    for the rest).
+    """
+    x = fighters.reshape(-1, fighters.shape[2])
+    sides = np.where(np.arange(DUEL_FIGHTERS) < DUEL_FIGHTERS // 2, 1, -1).astype(np.float32)
+    y = (np.asarray(results)[:, None] * sides).reshape(-1)
+    return x, y
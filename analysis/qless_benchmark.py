@@ -0,0 +1,220 @@
+import json
+import os
+import random
+import subprocess
+import time
+import tracemalloc
+
+import qless_search
+from qless_dice import DICE
+from qless_grids import load_grids
+from qless_lexicon import load_lexicon
+from qless_solver import RollContext, SearchStats, compile_grids
+
+# Settings
+SEED = 0  # seed for picking the corpus, so every run uses the same rolls
+VERIFIED_ROLLS = 10  # number of known-solvable rolls in the corpus
+RANDOM_ROLLS = 10  # number of random dice rolls in the corpus (mostly unsolvable)
+THRESHOLD = 5  # realness threshold for get_possible, prioritize and all_solutions
+STOP_AFTER = 10  # stop_after for all_solutions
+END_THRESHOLD = 1  # lowest threshold solve falls back to
+DESCEND = False  # descend for solve (see iter_solve in qless_search)
+MEASURE_MEMORY = True  # also run everything again under tracemalloc for peak memory
+
+# One line is appended per run, so runs at different commits can be compared.
+RESULTS_PATH = "analysis/benchmarks.jsonl"
+
+lexicon = load_lexicon()
+good = load_grids()
+templates = compile_grids(good)
+
+# Grids are tried in the order of grids.json rather than the learned order in
+# grid_stats.json, since that changes every time the roll finder runs.
+grid_order = list(range(len(good)))
+
+
+def load_corpus():
+    """
+    Pick the benchmark rolls: a seeded sample of the rolls in
+    verified_rolls.txt and candidates.json (which all have solutions), and
+    seeded random rolls of the real dice (which mostly don't).
+    """
+    known = set()
+    with open("analysis/verified_rolls.txt") as f:
+        known.update(l.strip() for l in f.readlines() if len(l.strip()) == 12)
+    with open("analysis/candidates.json") as f:
+        for rolls in json.load(f).values():
+            known.update(rolls)
+    rng = random.Random(SEED)
+    corpus = [(roll, "verified") for roll in rng.sample(sorted(known), VERIFIED_ROLLS)]
+    while len(corpus) < VERIFIED_ROLLS + RANDOM_ROLLS:
+        roll = "".join(sorted(rng.choice(die) for die in DICE))
+        if roll not in known:
+            corpus.append((roll, "random"))
+    return corpus
+
+
+def get_possible(letters):
+    return {'words': len(lexicon.get_possible(letters, THRESHOLD))}
+
+
+def prioritize(letters):
+    return {'words': len(RollContext(lexicon, letters).prioritized(THRESHOLD))}
+
+
+def all_solutions(letters):
+    """
+    The search in qless_roll_finder.all_solutions, for a roll with nothing in
+    the solution store.
+    """
+    entry, attempts = qless_search.all_solutions(
+        RollContext(lexicon, letters), templates, grid_order, THRESHOLD, STOP_AFTER
+    )
+    return {'solutions': len(entry['solutions']), 'grids_tried': len(attempts),
+            'nodes': sum(nodes for _, nodes, _ in attempts)}
+
+
+def solve(letters):
+    """
+    The search in qless_init.solve: find one solution, lowering the threshold
+    from THRESHOLD to END_THRESHOLD until there is one.
+    """
+    grids_tried = 0
+    nodes = 0
+    run = qless_search.iter_solve(RollContext(lexicon, letters), templates,
+                                  grid_order, THRESHOLD, END_THRESHOLD,
+                                  descend=DESCEND)
+    for _, threshold, solution, grid_nodes in run:
+        grids_tried += 1
+        nodes += grid_nodes
+        if solution is not None:
+            run.close()
+            return {'solved': True, 'threshold': threshold,
+                    'grids_tried': grids_tried, 'nodes': nodes}
+    return {'solved': False, 'threshold': None,
+            'grids_tried': grids_tried, 'nodes': nodes}
+
+
+def board(letters):
+    """
+    The search in qless_roll_finder.all_solutions with the "board" engine,
+    which isn't limited to the grids, so a roll it finds nothing for has no
+    solutions at all.
+    """
+    stats = SearchStats()
+    entry, _ = qless_search.all_solutions(
+        RollContext(lexicon, letters), templates, grid_order, THRESHOLD,
+        STOP_AFTER, stats, engine="board"
+    )
+    return {'solutions': len(entry['solutions']), 'nodes': stats.nodes}
+
+
+ENTRY_POINTS = {
+    'get_possible': get_possible,
+    'prioritize': prioritize,
+    'all_solutions': all_solutions,
+    'solve': solve,
+    'board': board
+}
+
+
+def percentile(values, p):
+    """Get the `p`th percentile of `values`, interpolating between ranks."""
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(results):
+    """Sum up the per-roll results of one entry point."""
+    seconds = [r['seconds'] for r in results]
+    summary = {
+        'p50': percentile(seconds, 50),
+        'p90': percentile(seconds, 90),
+        'p99': percentile(seconds, 99),
+        'max': max(seconds),
+        'total': sum(seconds)
+    }
+    for key in ['grids_tried', 'nodes']:
+        if key in results[0]:
+            summary[key] = sum(r[key] for r in results)
+    if 'peak_bytes' in results[0]:
+        summary['peak_bytes'] = max(r['peak_bytes'] for r in results)
+    return summary
+
+
+def current_commit():
+    """Get the hash of the checked-out commit, or None if git isn't available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+corpus = load_corpus()
+results = {name: [] for name in ENTRY_POINTS}
+for name, func in ENTRY_POINTS.items():
+    for roll, kind in corpus:
+        start = time.perf_counter()
+        result = func(roll)
+        seconds = time.perf_counter() - start
+        results[name].append({'roll': roll, 'kind': kind, 'seconds': seconds, **result})
+    print(f"Timed {name}")
+
+# Memory is measured in a separate pass, since tracing allocations slows
+# everything down.
+if MEASURE_MEMORY:
+    tracemalloc.start()
+    for name, func in ENTRY_POINTS.items():
+        for result in results[name]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(result['roll'])
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+run = {
+    'commit': current_commit(),
+    'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    'settings': {
+        'seed': SEED,
+        'verified_rolls': VERIFIED_ROLLS,
+        'random_rolls': RANDOM_ROLLS,
+        'threshold': THRESHOLD,
+        'stop_after': STOP_AFTER,
+        'end_threshold': END_THRESHOLD,
+        'descend': DESCEND
+    },
+    'summary': {name: summarize(results[name]) for name in ENTRY_POINTS},
+    'rolls': results
+}
+
+previous = None
+if os.path.exists(RESULTS_PATH):
+    with open(RESULTS_PATH) as f:
+        lines = [l for l in f.readlines() if len(l.strip()) > 0]
+    if len(lines) > 0:
+        previous = json.loads(lines[-1])
+
+with open(RESULTS_PATH, "a") as f:
+    f.write(json.dumps(run) + "\n")
+
+for name, summary in run['summary'].items():
+    line = f"{name}: p50 {summary['p50'] * 1000:.1f} ms, p90 {summary['p90'] * 1000:.1f} ms"
+    if 'grids_tried' in summary:
+        line += f", {summary['grids_tried']} grids"
+    if 'nodes' in summary:
+        line += f", {summary['nodes']} nodes"
+    if 'peak_bytes' in summary:
+        line += f", peak {summary['peak_bytes'] / 1024:.0f} KiB"
+    if previous is not None and previous['settings'] == run['settings'] and \
+            name in previous['summary']:
+        before = previous['summary'][name]['p50']
+        if before > 0:
+            line += f" ({summary['p50'] / before - 1:+.0%} p50 vs {previous['commit']})"
+    print(line)
@@ -0,0 +1,274 @@
+import collections
+
+# Crosswords are built on a board of ROWS x COLUMNS cells (14 x 25): rows 1
+# to 12 and columns 1 to 23 hold any 12-letter crossword whose first letter in
+# reading order is at FIRST_CELL (row 1, column 12), and the outermost rows and
+# columns are a border of cells that are always blocked, so walking off the
+# edge never needs checking.
+ROLL_SIZE = 12
+ROWS = ROLL_SIZE + 2
+COLUMNS = 2 * ROLL_SIZE + 1
+FIRST_CELL = COLUMNS + ROLL_SIZE
+
+# Steps between neighbouring cells in each direction: across (along a row,
+# 'down' in the grids.json format) and down (along a column).
+ACROSS = 0
+DOWN = 1
+STEPS = (1, COLUMNS)
+
+# Marks the switch from going backwards from a word's anchor letter to going
+# forwards from it, in an `AnchorTrie`.
+TURN = ">"
+
+
+class AnchorTrie:
+    """
+    A trie for finding the words through a letter already on the board (the
+    anchor) from the anchor out, like a GADDAG. Each word is in it once for
+    each of its letters: the letters from that one back to the start of the
+    word, then `TURN`, then the rest of the word. Each node is a dict from
+    letter (or `TURN`) to child node, and the key None marks the end of a
+    word, with the word as its value.
+    """
+
+    def __init__(self, words):
+        self.root = {}
+        for word in words:
+            for i in range(len(word)):
+                node = self.root
+                for letter in word[i::-1] + TURN + word[i + 1:]:
+                    node = node.setdefault(letter, {})
+                node[None] = word
+
+
+def substrings(words):
+    """Get every run of 2 or more letters that appears in any of `words`."""
+    found = set()
+    for word in words:
+        for start in range(len(word)):
+            for end in range(start + 2, len(word) + 1):
+                found.add(word[start:end])
+    return found
+
+
+def iter_board_search(words, letters, stats=None):
+    """
+    Yield every crossword that uses all of `letters` (the roll), with every
+    run of 2 or more letters across or down one of `words` (the roll's legal
+    words), without needing a grid template. Each is yielded as a list of
+    (first cell, direction, word) for its words, in the order they were
+    placed, which changes as the search goes on, so use it (or copy it)
+    before asking for the next. If the search finishes without yielding
+    anything, there is no solution.
+
+    The crossword is built out from its first letter in reading order.
+    Every letter placed adds two decisions to a queue: which word, if any,
+    goes through it across, and which goes through it down. The decision at
+    the front of the queue is either that there's no word (so the cells on
+    either side must stay empty) or a word from `words` through that letter,
+    found by walking an `AnchorTrie` out from it along the row or column. The
+    walk follows the letters already on the board, and only puts a letter in
+    an empty cell if the count of that letter left in the roll isn't 0 and
+    the run it makes the other way appears in some legal word. Every decision
+    is forced by the finished crossword, so each crossword is found exactly
+    once.
+
+    If `stats` (a `SearchStats`) is given, the search nodes and solutions are
+    added to it when the generator is finished or closed.
+    """
+    trie = AnchorTrie(words).root
+    runs = substrings(words)
+    remaining = dict(collections.Counter(letters))
+    size = ROWS * COLUMNS
+    board = [""] * size
+    blocked = [0] * size
+    # Whether the word through each cell across ([cell * 2]) and down
+    # ([cell * 2 + 1]) has been decided.
+    decided = [False] * (2 * size)
+    queue = []
+    placed = []
+    left = len(letters)
+    nodes = 0
+    found = 0
+
+    for cell in range(size):
+        row, column = divmod(cell, COLUMNS)
+        if row in (0, ROWS - 1) or column in (0, COLUMNS - 1):
+            blocked[cell] = 1
+    # Nothing can come before the first letter in reading order.
+    for cell in range(COLUMNS + 1, FIRST_CELL):
+        blocked[cell] = 1
+
+    def options(cell, direction, node):
+        """
+        Get the letters that could go in the empty `cell` next from trie
+        `node`, for a word going in `direction`: those left in the roll that
+        make a run the other way that appears in some legal word.
+        """
+        if blocked[cell]:
+            return []
+        step = STEPS[1 - direction]
+        before = board[cell - step]
+        after = board[cell + step]
+        if not before and not after:
+            return [l for l in node if remaining.get(l)]
+        while before and board[cell - step * (len(before) + 1)]:
+            before = board[cell - step * (len(before) + 1)] + before
+        n = 2
+        while after and board[cell + step * n]:
+            after += board[cell + step * n]
+            n += 1
+        return [l for l in node if remaining.get(l) and before + l + after in runs]
+
+    def place_word(first, last, direction, word, new, head):
+        """
+        Fill in the decisions made by putting `word` from `first` to `last`
+        (whose empty cells `new` have already been filled), and carry on.
+        """
+        nonlocal left
+        step = STEPS[direction]
+        blocked[first - step] += 1
+        blocked[last + step] += 1
+        for cell in range(first, last + step, step):
+            decided[2 * cell + direction] = True
+        for cell in new:
+            queue.append((cell, 1 - direction))
+        left -= len(new)
+        placed.append((first, direction, word))
+        yield from decide(head + 1)
+        placed.pop()
+        left += len(new)
+        del queue[len(queue) - len(new):]
+        for cell in range(first, last + step, step):
+            decided[2 * cell + direction] = False
+        blocked[first - step] -= 1
+        blocked[last + step] -= 1
+
+    def walk(cell, anchor, first, direction, node, new, head):
+        """
+        Extend a word through `anchor` by the letter in `cell` (or by each
+        letter that could go there), from trie `node` for the letters so far,
+        yielding from every crossword that can be built once it's placed.
+        Going backwards from the anchor, `first` is None; going forwards, it's
+        the cell the word starts at.
+        """
+        step = STEPS[direction]
+        letter = board[cell]
+        if letter:
+            if decided[2 * cell + direction] or letter not in node:
+                return
+            letters = [letter]
+        else:
+            letters = options(cell, direction, node)
+        for l in letters:
+            child = node[l]
+            if not letter:
+                board[cell] = l
+                remaining[l] -= 1
+                new.append(cell)
+            if first is None:
+                if TURN in child and not board[cell - step]:
+                    turned = child[TURN]
+                    if None in turned and not board[anchor + step]:
+                        yield from place_word(cell, anchor, direction, turned[None], new, head)
+                    if len(turned) > (None in turned):
+                        yield from walk(anchor + step, anchor, cell, direction, turned, new, head)
+                yield from walk(cell - step, anchor, None, direction, child, new, head)
+            else:
+                if None in child and not board[cell + step]:
+                    yield from place_word(first, cell, direction, child[None], new, head)
+                if len(child) > (None in child):
+                    yield from walk(cell + step, anchor, first, direction, child, new, head)
+            if not letter:
+                new.pop()
+                remaining[l] += 1
+                board[cell] = ""
+
+    def decide(head):
+        """Make the decision at `head` in the queue, and all the rest after it."""
+        nonlocal nodes, found
+        nodes += 1
+        while head < len(queue) and decided[2 * queue[head][0] + queue[head][1]]:
+            head += 1
+        if head == len(queue):
+            if left == 0:
+                found += 1
+                yield placed
+            return
+        anchor, direction = queue[head]
+        step = STEPS[direction]
+
+        # A word through the anchor.
+        yield from walk(anchor, anchor, None, direction, trie, [], head)
+
+        # No word through the anchor.
+        before = anchor - step
+        after = anchor + step
+        if not board[before] and not board[after]:
+            blocked[before] += 1
+            blocked[after] += 1
+            decided[2 * anchor + direction] = True
+            yield from decide(head + 1)
+            decided[2 * anchor + direction] = False
+            blocked[before] -= 1
+            blocked[after] -= 1
+
+    try:
+        for letter in sorted(remaining):
+            board[FIRST_CELL] = letter
+            remaining[letter] -= 1
+            left -= 1
+            queue[:] = [(FIRST_CELL, ACROSS), (FIRST_CELL, DOWN)]
+            yield from decide(0)
+            left += 1
+            remaining[letter] += 1
+            board[FIRST_CELL] = ""
+    finally:
+        if stats is not None:
+            stats.nodes += nodes
+            stats.solutions += found
+
+
+def to_solution(placed):
+    """
+    Convert a crossword from `iter_board_search` into the same shape as a
+    grid from grids.json with a 'word' added to each slot (see
+    `Template.solution`), moved to the top left corner.
+    """
+    cells = []
+    for first, direction, word in placed:
+        step = STEPS[direction]
+        cells.append([first + i * step for i in range(len(word))])
+    top = min(cell // COLUMNS for word in cells for cell in word)
+    left = min(cell % COLUMNS for word in cells for cell in word)
+    solution = []
+    for i, (first, direction, word) in enumerate(placed):
+        intersects = []
+        for position, cell in enumerate(cells[i]):
+            for j, other in enumerate(cells):
+                if j != i and cell in other:
+                    intersects.append([j, position, other.index(cell)])
+        solution.append({
+            'start': [first // COLUMNS - top, first % COLUMNS - left],
+            'length': len(word),
+            'down': direction == ACROSS,
+            'intersects': intersects,
+            'word': word
+        })
+    return solution
+
+
+def board_solutions(words, letters, limit=None, stats=None):
+    """
+    Find crosswords for the roll `letters` using `words` (see
+    `iter_board_search`), stopping once `limit` have been found (if given).
+    Returns them in the same shape as `Template.solution` does.
+    """
+    solutions = []
+    run = iter_board_search(words, letters, stats)
+    for placed in run:
+        solutions.append(to_solution(placed))
+        if limit is not None and len(solutions) >= limit:
+            break
+    run.close()
+    return solutions
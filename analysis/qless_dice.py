@@ -0,0 +1,89 @@
+import itertools
+
+from qless_lexicon import ALPHABET
+
+# The faces of the twelve real Q-less dice.
+DICE = [
+    "aeiouu",
+    "aaeeoo",
+    "iionny",
+    "nnrrhh",
+    "wrflld",
+    "hhpttw",
+    "ppvfgk",
+    "ggldrr",
+    "ccjtbd",
+    "ccsttm",
+    "szxnbk",
+    "mmblly"
+]
+
+
+def num_outcomes(dice=DICE):
+    """Get the number of equally likely ways the dice can land."""
+    total = 1
+    for die in dice:
+        total *= len(die)
+    return total
+
+
+def enumerate_rolls(dice=DICE, start_after=None):
+    """
+    Yield every distinct roll (sorted letters) the dice can make, in
+    alphabetical order, along with the number of ways the dice can land to
+    make it. Dividing that by `num_outcomes(dice)` gives its probability.
+
+    If `start_after` is given, only rolls that come after it alphabetically
+    are yielded, and everything before it is skipped without being
+    enumerated, so a sweep can resume from its last roll.
+
+    Rolls are built one letter of the alphabet at a time (so there are no
+    duplicates to remove), while tracking, for each set of dice that could
+    have produced the letters chosen so far, how many ways they could have.
+    """
+    faces = {
+        letter: [(d, die.count(letter)) for d, die in enumerate(dice) if letter in die]
+        for letter in ALPHABET
+    }
+    all_dice = (1 << len(dice)) - 1
+
+    def add_letter(ways, letter, copies):
+        """
+        Extend each set of dice in `ways` by `copies` more dice showing
+        `letter`.
+        """
+        extended = {}
+        for used, count in ways.items():
+            unused = [(d, n) for d, n in faces[letter] if not (used >> d) & 1]
+            for chosen in itertools.combinations(unused, copies):
+                new_used = used
+                new_count = count
+                for d, n in chosen:
+                    new_used |= 1 << d
+                    new_count *= n
+                extended[new_used] = extended.get(new_used, 0) + new_count
+        return extended
+
+    def extend(i, ways, prefix, bound):
+        if len(prefix) == len(dice):
+            if bound is None:
+                yield prefix, ways[all_dice]
+            return
+        if i == len(ALPHABET):
+            return
+        letter = ALPHABET[i]
+        # More copies of a letter sort earlier, so go from most to fewest.
+        most = min(len(dice) - len(prefix), len(faces[letter]))
+        for copies in range(most, -1, -1):
+            new_prefix = prefix + letter * copies
+            new_bound = bound
+            if bound is not None:
+                if new_prefix < bound[:len(new_prefix)]:
+                    continue
+                if new_prefix > bound[:len(new_prefix)]:
+                    new_bound = None
+            new_ways = add_letter(ways, letter, copies) if copies > 0 else ways
+            if len(new_ways) > 0:
+                yield from extend(i + 1, new_ways, new_prefix, new_bound)
+
+    yield from extend(0, {0: 1}, "", start_after)
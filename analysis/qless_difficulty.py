@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from qless_solver import RollContext, SearchStats, search, search_descending
+
+# Settings
+THRESHOLD = 5  # realness threshold that solutions are counted at
+MAX_REALNESS = 6  # highest realness a word can have
+MIN_REALNESS = 3  # lowest realness to look for the easiest solution at (the
+                  # daily page's threshold for legal words)
+SOLUTION_CAP = 1000  # stop counting solutions after this many
+PROCESSES = os.cpu_count()  # number of worker processes to score rolls with
+
+DIFFICULTY_PATH = "analysis/difficulty.json"
+CANDIDATES_PATH = "analysis/candidates.json"
+
+# The features of a roll, each with whether a higher value makes the roll
+# harder:
+# - solutions: distinct solutions at THRESHOLD (up to SOLUTION_CAP)
+# - easiest_realness: the highest threshold with any solution (0 if none down
+#   to MIN_REALNESS)
+# - grids_before_first: grids (in grids.json order) searched without a
+#   solution at THRESHOLD before the first one that has one
+# - branching: average candidate words per search node while counting
+FEATURES = {
+    'solutions': False,
+    'easiest_realness': False,
+    'grids_before_first': True,
+    'branching': False
+}
+
+
+def fingerprint(lexicon, letters, num_grids):
+    """
+    Get a key that changes whenever anything a roll's features depend on does:
+    its legal words and their realness, the number of grids, and the settings.
+    """
+    ids = RollContext(lexicon, letters).ids(MIN_REALNESS)
+    digest = hashlib.sha1()
+    digest.update(json.dumps(
+        [THRESHOLD, MAX_REALNESS, MIN_REALNESS, SOLUTION_CAP, num_grids]
+    ).encode())
+    for i in ids:
+        digest.update(f"{lexicon.words[i]}:{lexicon.realness[i]} ".encode())
+    return digest.hexdigest()
+
+
+def roll_features(lexicon, templates, letters):
+    """Compute the difficulty features (see `FEATURES`) of the roll `letters`."""
+    roll_index = RollContext(lexicon, letters).index(MIN_REALNESS, tagged=True)
+    stats = SearchStats()
+
+    def all_masks(template, threshold):
+        return [roll_index.at_least(threshold)] * len(template.grid)
+
+    solutions = 0
+    first = None
+    for i, template in enumerate(templates):
+        found, _ = search(template, roll_index, letters, SOLUTION_CAP - solutions,
+                          masks=all_masks(template, THRESHOLD), stats=stats)
+        if first is None and len(found) > 0:
+            first = i
+        solutions += len(found)
+        if solutions >= SOLUTION_CAP:
+            break
+
+    # If there are solutions at THRESHOLD, only higher thresholds need to be
+    # checked. If not, every grid has already failed there, so each lower
+    # threshold only needs the solutions using a word it newly allows.
+    easiest = 0
+    if solutions > 0:
+        easiest = THRESHOLD
+        for threshold in range(MAX_REALNESS, THRESHOLD, -1):
+            if any(
+                search(template, roll_index, letters, 1,
+                       masks=all_masks(template, threshold))[0]
+                for template in templates
+            ):
+                easiest = threshold
+                break
+    else:
+        for threshold in range(THRESHOLD - 1, MIN_REALNESS - 1, -1):
+            if any(
+                search_descending(template, roll_index, letters, threshold, 1)[0]
+                for template in templates
+            ):
+                easiest = threshold
+                break
+
+    return {
+        'solutions': solutions,
+        'easiest_realness': easiest,
+        'grids_before_first': len(templates) if first is None else first,
+        'branching': stats.branching()
+    }
+
+
+def load_difficulty(path=DIFFICULTY_PATH):
+    """Load the cached features of every roll scored so far, keyed by roll."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _ranks(values):
+    """
+    Get the rank of each of `values` from 0 (smallest) to 1 (largest), with
+    tied values sharing the average of their ranks.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return np.zeros(len(values))
+    _, inverse = np.unique(values, return_inverse=True)
+    order = np.argsort(values, kind="stable")
+    positions = np.empty(len(values))
+    positions[order] = np.arange(len(values))
+    average = np.bincount(inverse, positions) / np.bincount(inverse)
+    return average[inverse] / (len(values) - 1)
+
+
+def difficulty_scores(rolls, features):
+    """
+    Score each of `rolls` from 0 (easiest) to 1 (hardest), as the average of
+    its rank among `rolls` in each feature, oriented so higher is harder.
+    `features` maps each roll to its features.
+    """
+    total = np.zeros(len(rolls))
+    for name, harder_if_higher in FEATURES.items():
+        ranks = _ranks([features[roll][name] for roll in rolls])
+        total += ranks if harder_if_higher else 1 - ranks
+    return dict(zip(rolls, (total / len(FEATURES)).tolist()))
+
+
+def difficulty_bands(rolls, features, num_bands):
+    """
+    Split `rolls` into `num_bands` groups of (nearly) equal size by difficulty
+    score, easiest band first, with each band's rolls easiest first.
+    """
+    scores = difficulty_scores(rolls, features)
+    ordered = sorted(rolls, key=lambda roll: scores[roll])
+    return [band.tolist() for band in np.array_split(np.array(ordered, dtype=object), num_bands)]
+
+
+if __name__ == "__main__":
+    from qless_grids import load_grids
+    from qless_lexicon import load_lexicon
+    from qless_parallel import ordered_imap
+    from qless_solver import compile_grids
+
+    lexicon = load_lexicon()
+    templates = compile_grids(load_grids())
+
+    with open(CANDIDATES_PATH) as f:
+        rolls = list(dict.fromkeys(
+            roll for day in json.load(f).values() for roll in day
+        ))
+
+    difficulty = load_difficulty()
+    keys = {roll: fingerprint(lexicon, roll, len(templates)) for roll in rolls}
+    stale = [
+        roll for roll in rolls
+        if roll not in difficulty or difficulty[roll]['key'] != keys[roll]
+    ]
+    print(f"{len(rolls) - len(stale)} rolls cached, scoring {len(stale)}")
+
+    def score_roll(roll):
+        """Compute a roll's features. Run in a worker process in parallel mode."""
+        return roll, roll_features(lexicon, templates, roll)
+
+    for n, (roll, features) in enumerate(ordered_imap(score_roll, stale, PROCESSES)):
+        difficulty[roll] = {'key': keys[roll], **features}
+        # Save as we go, so an interrupted run keeps what it finished.
+        if (n + 1) % 10 == 0 or n + 1 == len(stale):
+            with open(DIFFICULTY_PATH + ".tmp", "w") as f:
+                json.dump(difficulty, f)
+            os.replace(DIFFICULTY_PATH + ".tmp", DIFFICULTY_PATH)
+            print(f"{n + 1} of {len(stale)} scored")
+
+    scores = difficulty_scores(rolls, difficulty)
+    for roll in sorted(rolls, key=lambda roll: scores[roll]):
+        features = {name: difficulty[roll][name] for name in FEATURES}
+        print(f"{roll} {scores[roll]:.2f} {features}")
@@ -0,0 +1,207 @@
+import json
+import os
+
+from qless_grids import GRIDS_JSON_PATH, write_grids
+from qless_lexicon import MIN_WORD_LENGTH
+from qless_parallel import ordered_imap
+
+# Settings
+TILES = 12  # number of letters in a roll, so tiles in every grid
+PROCESSES = os.cpu_count()  # number of worker processes to enumerate shapes with
+SHARDS = 64  # number of pieces to split the enumeration into
+SPLIT_TILES = 6  # shapes go to shards by their first SPLIT_TILES tiles
+OUTPUT_JSON_PATH = "analysis/generated_grids.json"  # in the grids.json format
+OUTPUT_PATH = "analysis/generated_grids.bin"  # grid store file (see qless_grids)
+
+# The grids are written to their own files rather than over grids.json, since
+# the grid indices in grid_stats.json and in the grids tried by the solution
+# store are indices into grids.json.
+
+NEIGHBOURS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+
+
+def iter_shapes(tiles, shard=0, shards=1, split=SPLIT_TILES):
+    """
+    Yield every connected shape of `tiles` cells once (up to translation),
+    as a list of (row, column) cells starting at (0, 0), the first cell in
+    reading order. The list changes as the enumeration goes on, so use it (or
+    copy it) before asking for the next.
+
+    This is Redelmeier's algorithm: a shape grows one cell at a time from the
+    untried cells next to it, and a cell that has been tried is left out of
+    every shape grown after it, so no shape comes up twice. If `shards` is
+    more than 1, only one piece of the enumeration is done: the shapes whose
+    first `split` cells are the `shard`th of every `shards` ways to start, so
+    running every shard covers every shape exactly once.
+    """
+    split = min(split, tiles)
+    shape = []
+    seen = {(0, 0)}
+    starts = 0
+
+    def extend(untried):
+        nonlocal starts
+        while len(untried) > 0:
+            cell = untried.pop()
+            shape.append(cell)
+            if len(shape) == split and shards > 1:
+                starts += 1
+                if starts % shards != shard:
+                    shape.pop()
+                    continue
+            if len(shape) == tiles:
+                yield shape
+            else:
+                new = []
+                for dr, dc in NEIGHBOURS:
+                    n = (cell[0] + dr, cell[1] + dc)
+                    if (n[0] > 0 or (n[0] == 0 and n[1] >= 0)) and n not in seen:
+                        new.append(n)
+                        seen.add(n)
+                yield from extend(untried + new)
+                for n in new:
+                    seen.remove(n)
+            shape.pop()
+
+    yield from extend([(0, 0)])
+
+
+def normalize(cells):
+    """Get `cells` moved to the top left corner, as a sorted tuple."""
+    top = min(r for r, c in cells)
+    left = min(c for r, c in cells)
+    return tuple(sorted((r - top, c - left) for r, c in cells))
+
+
+def transpose(cells):
+    """Get `cells` flipped over the diagonal, so rows become columns."""
+    return normalize([(c, r) for r, c in cells])
+
+
+def runs(cells):
+    """
+    Get the runs of 2 or more cells in a shape, as (first cell, length, down),
+    where down has the same meaning as in grids.json (true for a run along a
+    row).
+    """
+    occupied = set(cells)
+    found = []
+    for r, c in sorted(occupied):
+        for dr, dc, down in [(0, 1, True), (1, 0, False)]:
+            if (r - dr, c - dc) in occupied:
+                continue
+            length = 1
+            while (r + dr * length, c + dc * length) in occupied:
+                length += 1
+            if length > 1:
+                found.append(((r, c), length, down))
+    return found
+
+
+def grid_cells(grid):
+    """Get the cells covered by a grid in the grids.json format."""
+    cells = set()
+    for line in grid:
+        row, column = line['start']
+        for i in range(line['length']):
+            cells.add((row, column + i) if line['down'] else (row + i, column))
+    return normalize(cells)
+
+
+def shard_shapes(shard):
+    """
+    Get the crossword shapes in one shard of the enumeration (see
+    `iter_shapes`): those where every run is long enough to be a word. A shape
+    and its transpose can be filled with the same words, so only the one that
+    sorts first is kept.
+    """
+    shapes = []
+    for shape in iter_shapes(TILES, shard, SHARDS):
+        if all(length >= MIN_WORD_LENGTH for _, length, _ in runs(shape)):
+            cells = normalize(shape)
+            if cells <= transpose(cells):
+                shapes.append(cells)
+    return shapes
+
+
+def to_grid(cells):
+    """
+    Get a crossword shape as a grid in the grids.json format. The search fills
+    slots in the order they're listed, so they go out from the longest word,
+    with each one crossing a word listed before it.
+    """
+    slots = runs(cells)
+    covering = {}
+    for j, ((row, column), length, down) in enumerate(slots):
+        for i in range(length):
+            cell = (row, column + i) if down else (row + i, column)
+            covering.setdefault(cell, []).append((j, i))
+    crossings = [[] for _ in slots]
+    for pairs in covering.values():
+        if len(pairs) == 2:
+            (a, i), (b, k) = pairs
+            crossings[a].append((b, i, k))
+            crossings[b].append((a, k, i))
+
+    order = []
+    frontier = [max(range(len(slots)), key=lambda j: slots[j][1])]
+    while len(frontier) > 0:
+        j = frontier.pop(0)
+        if j in order:
+            continue
+        order.append(j)
+        frontier += sorted([b for b, _, _ in crossings[j] if b not in order],
+                           key=lambda b: -slots[b][1])
+    position = {j: n for n, j in enumerate(order)}
+    return [
+        {
+            'start': list(slots[j][0]),
+            'length': slots[j][1],
+            'down': slots[j][2],
+            'intersects': sorted([[position[b], i, k] for b, i, k in crossings[j]])
+        }
+        for j in order
+    ]
+
+
+def difficulty(grid):
+    """
+    Get a cheap estimate of how hard `grid` is to fill, lowest first, for
+    ordering grids that have no search history: crossings that close a loop
+    rule out the most, then each extra word is another one to find, and long
+    words leave fewer letters to place elsewhere.
+    """
+    crossings = sum(len(line['intersects']) for line in grid) // 2
+    loops = crossings - len(grid) + 1
+    return (loops, len(grid), -max(line['length'] for line in grid))
+
+
+if __name__ == "__main__":
+    # Grids already in grids.json keep their order (which is sorted by past
+    # success) and their slot order, ahead of every new one.
+    known = {}
+    if os.path.exists(GRIDS_JSON_PATH):
+        with open(GRIDS_JSON_PATH) as f:
+            for i, grid in enumerate(json.load(f)):
+                known.setdefault(grid_cells(grid), (i, grid))
+
+    ranked = []
+    for shapes in ordered_imap(shard_shapes, range(SHARDS), PROCESSES):
+        for cells in shapes:
+            matches = [known[k] for k in [cells, transpose(cells)] if k in known]
+            if len(matches) > 0:
+                i, grid = min(matches, key=lambda match: match[0])
+                ranked.append(((0, i), grid))
+            else:
+                grid = to_grid(cells)
+                ranked.append(((1, *difficulty(grid), cells), grid))
+    ranked.sort(key=lambda item: item[0])
+    grids = [grid for _, grid in ranked]
+
+    with open(OUTPUT_JSON_PATH + ".tmp", "w") as f:
+        json.dump(grids, f)
+    os.replace(OUTPUT_JSON_PATH + ".tmp", OUTPUT_JSON_PATH)
+    write_grids(grids, OUTPUT_PATH)
+    reused = sum(1 for key, _ in ranked if key[0] == 0)
+    print(f"Wrote {len(grids)} grids ({reused} from {GRIDS_JSON_PATH}) to "
+          f"{OUTPUT_JSON_PATH} and {OUTPUT_PATH}")
@@ -0,0 +1,194 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+GRIDS_JSON_PATH = "analysis/grids.json"
+GRIDS_PATH = "analysis/grids.bin"
+GRID_STATS_PATH = "analysis/grid_stats.json"
+
+# Grids are served best-first by successes / (search nodes + PRIOR_NODES).
+# Grids that have never had a solution all score 0 and keep their order from
+# grids.json, which is itself sorted by past success. Every roll, all counts
+# are multiplied by STATS_DECAY so that old results gradually matter less.
+PRIOR_NODES = 100
+STATS_DECAY = 0.999
+
+# A grid store file is this header (magic, number of grids, number of slots,
+# number of intersections), followed by these arrays, back to back:
+# - grid offsets (uint32, grids + 1): where each grid's slots start
+# - intersection offsets (uint32, slots + 1): where each slot's intersections
+#   start
+# - slots (uint8, slots x 4): start row, start column, length, down
+# - intersections (uint8, intersections x 3): the same triples as in the
+#   'intersects' lists of grids.json
+MAGIC = b"QLGRIDS1"
+HEADER = struct.Struct("<8sIII")
+
+
+def write_grids(grids, path=GRIDS_PATH):
+    """Write `grids` (in the grids.json format) to a grid store file at `path`."""
+    grid_offsets = [0]
+    intersect_offsets = [0]
+    slots = []
+    intersects = []
+    for grid in grids:
+        for line in grid:
+            slots.append([*line['start'], line['length'], int(line['down'])])
+            intersects += line['intersects']
+            intersect_offsets.append(len(intersects))
+        grid_offsets.append(len(slots))
+    arrays = [
+        np.array(grid_offsets, dtype=np.uint32),
+        np.array(intersect_offsets, dtype=np.uint32),
+        np.array(slots, dtype=np.uint8).reshape(-1, 4),
+        np.array(intersects, dtype=np.uint8).reshape(-1, 3)
+    ]
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(grids), len(slots), len(intersects)))
+        for array in arrays:
+            f.write(array.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def convert(json_path=GRIDS_JSON_PATH, path=GRIDS_PATH):
+    """Convert the grids in `json_path` to a grid store file at `path`."""
+    with open(json_path) as f:
+        write_grids(json.load(f), path)
+
+
+class GridStore:
+    """
+    Read-only, memory-mapped access to a grid store file. Grids are decoded
+    into the grids.json format (a list of slot dicts) only when they are
+    indexed or iterated over, so loading is nearly free and forked worker
+    processes share the same pages.
+    """
+
+    def __init__(self, path=GRIDS_PATH):
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, num_grids, num_slots, num_intersects = HEADER.unpack(
+            bytes(buffer[:HEADER.size])
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a grid store file")
+        offset = HEADER.size
+
+        def take(count, dtype, width=None):
+            nonlocal offset
+            size = count * np.dtype(dtype).itemsize * (width or 1)
+            array = buffer[offset:offset + size].view(dtype)
+            offset += size
+            return array if width is None else array.reshape(-1, width)
+
+        self.grid_offsets = take(num_grids + 1, np.uint32)
+        self.intersect_offsets = take(num_slots + 1, np.uint32)
+        self.slots = take(num_slots, np.uint8, 4)
+        self.intersects = take(num_intersects, np.uint8, 3)
+
+    def __len__(self):
+        return len(self.grid_offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("grid index out of range")
+        start, end = self.grid_offsets[i:i + 2].tolist()
+        slots = self.slots[start:end].tolist()
+        offsets = self.intersect_offsets[start:end + 1].tolist()
+        intersects = self.intersects[offsets[0]:offsets[-1]].tolist()
+        return [
+            {
+                'start': [row, column],
+                'length': length,
+                'down': bool(down),
+                'intersects': intersects[offsets[j] - offsets[0]:offsets[j + 1] - offsets[0]]
+            }
+            for j, (row, column, length, down) in enumerate(slots)
+        ]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def load_grids(path=GRIDS_PATH, json_path=GRIDS_JSON_PATH):
+    """
+    Open the grid store at `path`, first converting it from `json_path` if it
+    doesn't exist yet or the JSON has been modified since.
+    """
+    if (not os.path.exists(path)) or (
+        os.path.exists(json_path) and
+        os.path.getmtime(json_path) > os.path.getmtime(path)
+    ):
+        convert(json_path, path)
+    return GridStore(path)
+
+
+class GridStats:
+    """
+    How often each grid has been searched, how many search nodes that took,
+    and how often it had a solution, used to try the most promising grids
+    first.
+    """
+
+    def __init__(self, num_grids):
+        self.attempts = np.zeros(num_grids)
+        self.nodes = np.zeros(num_grids)
+        self.successes = np.zeros(num_grids)
+
+    def record(self, grid, nodes, success):
+        """Record that `grid` was searched, taking `nodes` search nodes."""
+        self.attempts[grid] += 1
+        self.nodes[grid] += nodes
+        if success:
+            self.successes[grid] += 1
+
+    def decay(self):
+        """Make all past results count for a little less. Call once per roll."""
+        for counts in [self.attempts, self.nodes, self.successes]:
+            counts *= STATS_DECAY
+
+    def scores(self):
+        """Get the estimated chance of success per search node of each grid."""
+        return self.successes / (self.nodes + PRIOR_NODES)
+
+    def order(self):
+        """
+        Get every grid index, best first. Ties keep the order of grids.json,
+        so with no statistics this is the same as going through in order.
+        """
+        return np.argsort(-self.scores(), kind="stable").tolist()
+
+    def save(self, path=GRID_STATS_PATH):
+        with open(path, "w") as f:
+            json.dump({
+                'attempts': self.attempts.tolist(),
+                'nodes': self.nodes.tolist(),
+                'successes': self.successes.tolist()
+            }, f)
+
+
+def load_grid_stats(num_grids, path=GRID_STATS_PATH):
+    """
+    Load the grid statistics saved at `path`, or start new ones if there are
+    none yet or they were saved for a different number of grids.
+    """
+    stats = GridStats(num_grids)
+    if os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        if len(saved['attempts']) == num_grids:
+            stats.attempts = np.array(saved['attempts'])
+            stats.nodes = np.array(saved['nodes'])
+            stats.successes = np.array(saved['successes'])
+    return stats
+
+
+if __name__ == "__main__":
+    convert()
+    print(f"Converted {len(GridStore())} grids from {GRIDS_JSON_PATH} to {GRIDS_PATH}")
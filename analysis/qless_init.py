@@ -1,102 +1,52 @@
 import json
 
+from qless_dice import DICE
+from qless_grids import load_grid_stats, load_grids
+from qless_lexicon import load_lexicon, append_ratings
+from qless_search import iter_solve
+from qless_solution_store import load_solution_store
+from qless_solver import RollContext, SearchStats, compile_grids
+from qless_word_impact import WordImpactIndex
 
-with open("analysis/realness.json") as f:
-    realness = json.load(f)
+lexicon = load_lexicon()
+new_ratings = {}
 
-with open("analysis/grids.json") as f:
-    good = json.load(f)
+good = load_grids()
+templates = compile_grids(good)
+grid_stats = load_grid_stats(len(good))
 
 def write():
-    with open("analysis/realness.json", "w") as f:
-        json.dump(realness, f)
+    append_ratings(new_ratings)
+    new_ratings.clear()
 
-def is_possible(word, letters):
-    if len(word) < 3:
-        return False
-    for letter in "abcdefghijklmnopqrstuvwxyz":
-        if word.count(letter) > letters.count(letter):
-            return False
-    return True
+# The `RollContext` of the last roll looked at, so `prioritize` and `solve` on
+# the same roll share its word lists and indices. Rating a word changes which
+# words are legal, so it's dropped then.
+last_context = {}
+
+def roll_context(letters):
+    if letters not in last_context:
+        last_context.clear()
+        last_context[letters] = RollContext(lexicon, letters)
+    return last_context[letters]
+
+def rate(word, value):
+    new_ratings[word] = value
+    lexicon.set_realness(word, value)
+    last_context.clear()
 
 def get_possible(letters, threshold=5):
-    return [
-        word for word in realness
-        if (realness[word] >= threshold) and is_possible(word, letters)
-    ]
+    return lexicon.get_possible(letters, threshold)
 
 def prioritize(letters, threshold=5):
-    words = get_possible(letters, threshold)
-    available = {
-        letter: letters.count(letter) for letter in letters
-    }
-    avg_occurrence = sum([len(w) for w in words]) / len(set([l for l in letters]))
-    need = {
-        letter: avg_occurrence - sum([w.count(letter) for w in words]) / available[letter] for letter in available
-    }
-    return sorted(words,
-                  key=lambda w: sum([need[l] for l in w]),
-                  reverse = True)
-
-def can_intersect(test_index, with_index, test_word, with_word):
-    return test_word[test_index] == with_word[with_index]
-
-tries = 0
-
-def try_grid(grid, letters, words):
-    globals()['tries'] += 1
-    j = 0
-    for line in grid:
-        if "word" not in line:
-            break
-        j += 1
-    if "word" in line:
-        return grid
-    candidates = [w for w in words if len(w) == line['length']]
-    constraints = [l for l in line['intersects'] if l[0] < j]
-    letters_present = "".join([grid[l[0]]['word'][l[2]] for l in constraints])
-    for l in constraints:
-        candidates = [w for w in candidates if can_intersect(l[1], l[2], w, grid[l[0]]['word'])]
-    for w in candidates:
-        new_grid = [g for g in grid]
-        new_grid[j] = {
-            **new_grid[j],
-            'word': w
-        }
-        new_letters = letters + letters_present
-        legal = True
-        for l in w:
-            if l not in new_letters:
-                legal = False
-                break
-            new_letters = "".join(new_letters.split(l, 1))
-        if legal:
-            result = try_grid(new_grid, new_letters, words)
-            if result is not None:
-                return result
-    return None
+    return roll_context(letters).prioritized(threshold)
 
 import random
 
 def generate_roll():
     return "".join(
         sorted(
-            [random.choice([face for face in die]) for die in
-                [
-                    "aeiouu",
-                    "aaeeoo",
-                    "iionny",
-                    "nnrrhh",
-                    "wrflld",
-                    "hhpttw",
-                    "ppvfgk",
-                    "ggldrr",
-                    "ccjtbd",
-                    "ccsttm",
-                    "szxnbk",
-                    "mmblly"
-                ]
-            ]
+            [random.choice([face for face in die]) for die in DICE]
         )
     )
 
@@ -112,57 +62,60 @@ def prettify(solution):
                 grid[w['start'][0] + i][w['start'][1]] = l
     return "\n".join(["".join(l) for l in grid]).rstrip()
 
-successes = []
-tries_by_grid = [0 for _ in good]
-
-words_used = { w: 0 for w in realness }
+words_used = { w: 0 for w in lexicon.words }
 
 last_letters = None
 last_fail = (5, -1)
+last_ordering = []
 
-def solve(letters, start_threshold=5, end_threshold=1, randomize=False, check_first=len(good), do_all=False):
+# Pass a SearchStats as `stats` to see what the search did, e.g.
+# `stats = SearchStats(); solve(roll, stats=stats); stats.hottest()`.
+# See `iter_solve` in qless_search for what `descend` does. Either way, the
+# solution returned has the highest realness found.
+def solve(letters, start_threshold=5, end_threshold=1, randomize=False, check_first=len(good), do_all=False, stats=None, descend=False):
     letters = letters.lower()
+    if stats is None:
+        stats = SearchStats()
     if letters != globals()['last_letters']:
         globals()['last_letters'] = letters
         globals()['last_fail'] = (5, -1)
+        globals()['last_ordering'] = grid_stats.order()
+        grid_stats.decay()
+    # Grids are tried best-first; `last_fail` records how far through that
+    # order the last attempt at these letters got.
+    rank = { grid: r for r, grid in enumerate(last_ordering) }
     real_threshold = min(start_threshold, last_fail[0])
-    words = prioritize(letters, real_threshold)
-    ordering = [i for i in range(len(good))]
+    ordering = list(last_ordering)
     if randomize:
         random.shuffle(ordering)
     if check_first < len(good):
         ordering = ordering[:check_first]
-    for i in ordering:
-        grid = good[i]
-        if i > last_fail[1]:
-            globals()['tries'] = 0
-            solution = try_grid(grid, letters, words)
-            globals()['tries_by_grid'][i] += globals()['tries']
-            if solution is not None:
-                globals()['successes'].append(i)
-                for w in solution:
-                    globals()['words_used'][w['word']] += 1
-                if not do_all:
-                    return solution
-            globals()['last_fail'] = (real_threshold, i)
-    for threshold in range(real_threshold - 1, end_threshold - 1, -1):
-        print(f"Threshold: {threshold}")
-        words = prioritize(letters, threshold)
-        for i in ordering:
-            grid = good[i]
-            globals()['tries'] = 0
-            solution = try_grid(grid, letters, words)
-            globals()['tries_by_grid'][i] += globals()['tries']
-            if solution is not None:
-                globals()['successes'].append(i)
-                for w in solution:
-                    globals()['words_used'][w['word']] += 1
-                if not do_all:
-                    return solution
-            globals()['last_fail'] = (threshold, i)
+    # The grids up to `last_fail` only need skipping if they failed at this
+    # threshold. If it's lower, they failed at a higher one, so they're
+    # searched again (and the descending search, which takes every grid to
+    # have failed at the threshold above, is still right).
+    if real_threshold == last_fail[0]:
+        skip = { i for i in ordering if rank[i] <= last_fail[1] }
+    else:
+        skip = set()
+    run = iter_solve(roll_context(letters), templates, ordering,
+                     real_threshold, end_threshold, skip, stats, descend)
+    current = real_threshold
+    for i, threshold, solution, nodes in run:
+        if threshold != current:
+            current = threshold
+            print(f"Threshold: {threshold}")
+        grid_stats.record(i, nodes, solution is not None)
+        if solution is not None:
+            for w in solution:
+                words_used[w['word']] += 1
+            if not do_all:
+                run.close()
+                return solution
+        globals()['last_fail'] = (threshold, rank[i])
     return None
 
-words_used = { w: 0 for w in realness }
+words_used = { w: 0 for w in lexicon.words }
 
 for i in range(100):
     if (i > 0) and (i % 10 == 0):
@@ -171,31 +124,36 @@ for i in range(100):
           end_threshold=5,
           check_first=25)
 
-def success(i):
-    return successes.count(i) / (tries_by_grid[i] + 100)
-best = sorted([(i, successes.count(i), tries_by_grid[i]) for i in range(len(good))], key=lambda x: success(x[0]), reverse=True)
-best[:30]
+grid_stats.save()
+[(i, grid_stats.successes[i], grid_stats.nodes[i]) for i in grid_stats.order()[:30]]
 
 with open("approved.json") as f:
     approved = set(json.load(f))
 
 most_used = sorted([(w, words_used[w])
                     for w in words_used
-                    if (w not in approved) and (realness[w] == 5)],
+                    if (w not in approved) and (lexicon.realness_of(w) == 5)],
                    key=lambda x: x[1],
                    reverse=True)[:10]
 most_used
 
-realness['worrits'] = 2
-realness['vizor'] = 2
-realness['yep'] = 3
-realness['yack'] = 4
-realness['toby'] = 2
-realness['winnock'] = 3
+# Unrated words by how many stored rolls would be left with no solutions if
+# they were rated below 5.
+impact = WordImpactIndex(load_solution_store(), follow=False)
+most_gating = impact.ranked([w for w in impact.uses
+                             if (w not in approved) and (lexicon.realness_of(w) == 5)])[:10]
+most_gating
+
+rate('worrits', 2)
+rate('vizor', 2)
+rate('yep', 3)
+rate('yack', 4)
+rate('toby', 2)
+rate('winnock', 3)
 write()
 
 for x in most_used:
-    if (realness[x[0]] == 5) and (x[1] > 0):
+    if (lexicon.realness_of(x[0]) == 5) and (x[1] > 0):
         approved.add(x[0])
 
 with open("approved.json", "w") as f:
@@ -205,10 +163,3 @@ roll = generate_roll()
 roll
 
 print(prettify(solve("mmooddhckpbh", start_threshold=5)))
-
-good = [good[i[0]] for i in best]
-successes = []
-tries_by_grid = [0 for _ in good]
-
-with open("grids6.json", "w") as f:
-    json.dump(good, f)
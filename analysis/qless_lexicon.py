@@ -0,0 +1,371 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+ALL_LETTERS_MASK = (1 << len(ALPHABET)) - 1
+MIN_WORD_LENGTH = 3
+MAX_WORD_LENGTH = 12
+
+RATINGS_PATH = "analysis/ratings.csv"
+WORDLIST1_PATH = "analysis/wordlist1.txt"
+WORDLIST2_PATH = "analysis/wordlist2.txt"
+CACHE_DIR = "analysis/.lexicon-cache"
+CACHE_VERSION = 4
+
+# The most (word, roll) pairs to bitmask-test at once in `possible_ids_batch`.
+BATCH_PAIRS = 1 << 24
+
+
+def _letter_codes(text):
+    """
+    Convert `text` to an array of alphabet positions (0 for "a" up to 25 for
+    "z"). Characters outside the alphabet get a value of 26 or more.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    return np.minimum(codes - ord("a"), len(ALPHABET)).astype(np.int64)
+
+
+def letter_counts(letters):
+    """
+    Get a 26-slot vector of how many times each letter of the alphabet appears
+    in `letters`.
+    """
+    codes = _letter_codes(letters)
+    counts = np.bincount(codes, minlength=len(ALPHABET) + 1)[:len(ALPHABET)]
+    return counts.astype(np.uint8)
+
+
+def letter_mask(letters):
+    """
+    Get a bitmask with bit `i` set if the `i`th letter of the alphabet appears
+    in `letters`.
+    """
+    mask = 0
+    for letter in letters:
+        if letter in ALPHABET:
+            mask |= 1 << (ord(letter) - ord("a"))
+    return mask
+
+
+class LexiconIndex:
+    """
+    Precomputed letter data for every word in the lexicon: a (words x 26)
+    uint8 matrix of letter counts and a bitmask of which letters each word
+    uses. Filtering the words that can be made from a roll is then a bitmask
+    subset test followed by one vectorized count comparison, instead of
+    running `str.count` 26 times per word.
+
+    `version` identifies the ratings file and wordlists the realness comes
+    from, if it's known (see `lexicon_version`). Changing a word's realness
+    in memory makes it unknown.
+    """
+
+    def __init__(self, words, realness, counts=None, definitions=None, version=None):
+        self.words = list(words)
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        self.realness = np.array(realness, dtype=np.int8)
+        self.lengths = np.array([len(w) for w in self.words], dtype=np.uint8)
+        self.definitions = definitions
+        self.version = version
+
+        if counts is None:
+            codes = _letter_codes("".join(self.words))
+            rows = np.repeat(np.arange(len(self.words)), self.lengths)
+            in_alphabet = codes < len(ALPHABET)
+            counts = np.zeros((len(self.words), len(ALPHABET)), dtype=np.uint8)
+            np.add.at(counts, (rows[in_alphabet], codes[in_alphabet]), 1)
+        self.counts = counts
+
+        bits = np.uint32(1) << np.arange(len(ALPHABET), dtype=np.uint32)
+        self.masks = (self.counts > 0).astype(np.uint32) @ bits
+
+    @classmethod
+    def from_realness(cls, realness):
+        """Build an index from a dict mapping each word to its realness."""
+        return cls(realness.keys(), list(realness.values()))
+
+    def realness_of(self, word):
+        """Get the realness of `word`, which must already be indexed."""
+        return int(self.realness[self.ids[word]])
+
+    def definition(self, word):
+        """Get the definition of `word`, or an empty string if it has none."""
+        if self.definitions is None or word not in self.ids:
+            return ""
+        return self.definitions[self.ids[word]]
+
+    def set_realness(self, word, value):
+        """Update the realness of `word`, which must already be indexed."""
+        self.realness[self.ids[word]] = value
+        self.version = None
+
+    def possible_ids(self, letters, threshold=5):
+        """
+        Get the indices (in lexicon order) of all words with realness >=
+        `threshold` that can be formed using the set of letters in `letters`.
+        """
+        missing = np.uint32(ALL_LETTERS_MASK & ~letter_mask(letters))
+        candidates = np.flatnonzero(
+            (self.realness >= threshold) &
+            (self.lengths >= MIN_WORD_LENGTH) &
+            ((self.masks & missing) == 0)
+        )
+        fits = (self.counts[candidates] <= letter_counts(letters)).all(axis=1)
+        return candidates[fits]
+
+    def get_possible(self, letters, threshold=5):
+        """
+        Get all words (in lexicon order) with realness >= `threshold` that can
+        be formed using the set of letters in `letters`.
+        """
+        return [self.words[i] for i in self.possible_ids(letters, threshold)]
+
+    def possible_ids_batch(self, rolls, threshold=5):
+        """
+        Like `possible_ids`, but for every roll in `rolls` at once. The eligible
+        words are bitmask-tested against all the rolls together (a block of
+        rolls at a time, to bound memory), and the letter counts are then
+        compared for just the (word, roll) pairs that pass, in one go. Returns
+        a list with an array of word indices for each roll.
+        """
+        eligible = np.flatnonzero(
+            (self.realness >= threshold) & (self.lengths >= MIN_WORD_LENGTH)
+        )
+        masks = self.masks[eligible]
+        block = max(1, BATCH_PAIRS // max(1, len(eligible)))
+        results = []
+        for start in range(0, len(rolls), block):
+            chunk = rolls[start:start + block]
+            missing = np.array(
+                [ALL_LETTERS_MASK & ~letter_mask(roll) for roll in chunk],
+                dtype=np.uint32
+            )
+            roll_counts = np.array([letter_counts(roll) for roll in chunk])
+            # Pairs come out grouped by roll, with words in lexicon order.
+            roll_of, word_of = np.nonzero((missing[:, None] & masks[None, :]) == 0)
+            fits = (self.counts[eligible[word_of]] <= roll_counts[roll_of]).all(axis=1)
+            roll_of = roll_of[fits]
+            ids = eligible[word_of[fits]]
+            bounds = np.searchsorted(roll_of, np.arange(len(chunk) + 1))
+            results += [ids[bounds[i]:bounds[i + 1]] for i in range(len(chunk))]
+        return results
+
+    def get_possible_batch(self, rolls, threshold=5):
+        """
+        Get the words (in lexicon order) with realness >= `threshold` that can
+        be formed from each roll in `rolls`.
+        """
+        return [
+            [self.words[i] for i in ids]
+            for ids in self.possible_ids_batch(rolls, threshold)
+        ]
+
+
+class Definitions:
+    """
+    Definitions for every word in a lexicon, stored as one UTF-8 blob plus an
+    array of offsets into it, and decoded only when looked up.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+
+def read_ratings(ratings_path=RATINGS_PATH):
+    """Get the rows of the ratings file, as (word, realness) in file order."""
+    with open(ratings_path) as f:
+        reader = csv.reader(f, delimiter=",", quotechar="\"")
+        return [(row[0], int(row[1])) for row in reader]
+
+
+def read_sources(ratings_path=RATINGS_PATH,
+                 wordlist1_path=WORDLIST1_PATH,
+                 wordlist2_path=WORDLIST2_PATH):
+    """
+    Parse the ratings file and both wordlists into a dict mapping each word to
+    its realness and a dict mapping words to their definitions. Words in a
+    wordlist without a rating get a realness of 5.
+    """
+    realness = {}
+    definitions = {}
+    for word, value in read_ratings(ratings_path):
+        realness[word] = value
+
+    # wordlist2 comes first, so words are in the same order as they always
+    # have been, which decides the order of ties in `prioritize`.
+    with open(wordlist2_path) as f:
+        for line in f.readlines():
+            if " " in line:
+                [word, definition] = line.split(" ", 1)
+                word = word.lower()
+                definitions[word] = definition.strip()
+                if MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH:
+                    if word not in realness:
+                        realness[word] = 5
+
+    with open(wordlist1_path) as f:
+        for line in f.readlines():
+            if "\t" in line:
+                word = line.split("\t", 1)[0].lower()
+                if MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH:
+                    if word not in realness:
+                        realness[word] = 5
+    return realness, definitions
+
+
+def _cache_key(paths):
+    """Identify the current version of each source file by its size and mtime."""
+    key = []
+    for path in paths:
+        stat = os.stat(path)
+        key.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return {"version": CACHE_VERSION, "sources": key}
+
+
+def _write_cache(cache_dir, key, realness, definitions, version):
+    """Build the lexicon arrays from parsed sources and save them to `cache_dir`."""
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    words = list(realness)
+    index = LexiconIndex(words, list(realness.values()))
+    encoded = [definitions.get(w, "").encode() for w in words]
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(d) for d in encoded])
+    # Pad the blobs by a byte so they are never empty, since empty arrays
+    # cannot be memory-mapped.
+    arrays = {
+        "words": np.frombuffer("".join(w + "\n" for w in words).encode() + b"\0", dtype=np.uint8),
+        "realness": index.realness,
+        "counts": index.counts,
+        "definitions": np.frombuffer(b"".join(encoded) + b"\0", dtype=np.uint8),
+        "definition_offsets": offsets
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(cache_dir, name + ".npy"), array)
+    with open(meta_path, "w") as f:
+        json.dump({"key": key, "version": version}, f)
+
+
+def load_lexicon(ratings_path=RATINGS_PATH,
+                 wordlist1_path=WORDLIST1_PATH,
+                 wordlist2_path=WORDLIST2_PATH,
+                 cache_dir=CACHE_DIR):
+    """
+    Load the lexicon as a `LexiconIndex` with definitions attached. The parsed
+    ratings and wordlists are cached in `cache_dir` as memory-mappable arrays,
+    which are rebuilt only when one of the source files changes.
+    """
+    key = _cache_key([ratings_path, wordlist1_path, wordlist2_path])
+    meta_path = os.path.join(cache_dir, "meta.json")
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    if meta.get("key") != key:
+        realness, definitions = read_sources(ratings_path, wordlist1_path, wordlist2_path)
+        meta = {"key": key,
+                "version": lexicon_version(ratings_path, wordlist1_path, wordlist2_path)}
+        _write_cache(cache_dir, key, realness, definitions, meta["version"])
+
+    def load(name):
+        return np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r")
+
+    words = bytes(load("words")).decode().split("\n")[:-1]
+    return LexiconIndex(
+        words,
+        load("realness"),
+        counts=load("counts"),
+        definitions=Definitions(load("definitions"), load("definition_offsets")),
+        version=meta["version"]
+    )
+
+
+def _fingerprint(rows, wordlist_paths):
+    """
+    Get a digest of the ratings rows `rows` and the contents of the wordlists
+    at `wordlist_paths`.
+    """
+    digest = hashlib.sha1()
+    for word, value in rows:
+        digest.update(f"{word},{value}\n".encode())
+    for path in wordlist_paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()[:16]
+
+
+def lexicon_version(ratings_path=RATINGS_PATH,
+                    wordlist1_path=WORDLIST1_PATH,
+                    wordlist2_path=WORDLIST2_PATH):
+    """
+    Get the version of the lexicon the source files make, as "rows:digest":
+    the number of rows in the ratings file, and a digest of those rows and
+    both wordlists (see `rated_since`).
+    """
+    rows = read_ratings(ratings_path)
+    return f"{len(rows)}:{_fingerprint(rows, [wordlist1_path, wordlist2_path])}"
+
+
+# The result of `rated_since` for each version, by the identity of the source
+# files (see `_cache_key`).
+_rated_since = {}
+
+
+def rated_since(version,
+                ratings_path=RATINGS_PATH,
+                wordlist1_path=WORDLIST1_PATH,
+                wordlist2_path=WORDLIST2_PATH):
+    """
+    Get the set of words whose realness may have changed since the lexicon
+    was at `version` (see `lexicon_version`): those with a row in the ratings
+    file after the rows that version had. That's only known if the file still
+    starts with exactly those rows and the wordlists are unchanged, so None is
+    returned if they aren't (or `version` is None), and every word should be
+    taken to have changed.
+    """
+    if version is None:
+        return None
+    paths = [ratings_path, wordlist1_path, wordlist2_path]
+    key = (json.dumps(_cache_key(paths)), version)
+    if key not in _rated_since:
+        count, digest = version.split(":")
+        rows = read_ratings(ratings_path)
+        unchanged = (int(count) <= len(rows) and
+                     _fingerprint(rows[:int(count)], paths[1:]) == digest)
+        _rated_since[key] = (
+            {word for word, _ in rows[int(count):]} if unchanged else None
+        )
+    return _rated_since[key]
+
+
+def append_ratings(ratings, ratings_path=RATINGS_PATH):
+    """
+    Append new realness ratings (a dict mapping words to scores) to the end of
+    the ratings file. Later rows take precedence over earlier ones for the
+    same word, so this also works for changing an existing rating.
+    """
+    if len(ratings) == 0:
+        return
+    with open(ratings_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        needs_newline = f.tell() > 0
+        if needs_newline:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    with open(ratings_path, "a", newline="") as f:
+        if needs_newline:
+            f.write("\n")
+        writer = csv.writer(f, delimiter=",", quotechar="\"", lineterminator="\n")
+        for word, score in ratings.items():
+            writer.writerow([word, score])
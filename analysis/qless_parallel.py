@@ -0,0 +1,34 @@
+import collections
+import multiprocessing
+
+
+def ordered_imap(func, items, processes, window=None):
+    """
+    Yield `func(item)` for each of `items`, in order, spreading the calls
+    across `processes` worker processes.
+
+    Workers are forked from the current process, so they share whatever it has
+    already loaded (the lexicon, compiled grids, stored solutions) instead of
+    having it pickled for every task; only the item and its result cross the
+    process boundary. `items` is consumed lazily, at most `window` (by default
+    twice the number of processes) ahead of the result being yielded, so it
+    can be an endless generator. With one process, this is just `map`.
+    """
+    if processes <= 1:
+        yield from map(func, items)
+        return
+    if window is None:
+        window = 2 * processes
+    items = iter(items)
+    pending = collections.deque()
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= window:
+                break
+        while len(pending) > 0:
+            result = pending.popleft().get()
+            for item in items:
+                pending.append(pool.apply_async(func, (item,)))
+                break
+            yield result
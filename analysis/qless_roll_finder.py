@@ -1,60 +1,61 @@
-import json
-import csv
+import os
 import random
 
+import qless_search
+from qless_dice import DICE
+from qless_grids import load_grid_stats, load_grids
+from qless_lexicon import load_lexicon
+from qless_parallel import ordered_imap
+from qless_solution_store import load_solution_store
+from qless_solver import RollContext, SearchStats, compile_grids
+from qless_word_impact import WordImpactIndex
+
 # Settings
 ANY_LETTERS = False  # if false, restrict rolls to only those that could appear
                     # from real Q-less dice
 NUM_ROLLS = 20  # number of rolls to generate
-
-definitions = {}
-realness = {}
+PROCESSES = os.cpu_count()  # number of worker processes to screen rolls with;
+                            # results are merged in the same order as with 1
+PROFILE = False  # if true, print the grids that took longest to search
+ENGINE = "grids"  # "grids" to fill the grids in grids.json, or "board" to build
+                  # crosswords of any shape (see qless_board), which also
+                  # proves a roll with no solutions has none
 
 # Load flat files
-with open("analysis/ratings.csv") as f:
-    reader = csv.reader(f, delimiter=",", quotechar="\"")
-    for row in reader:
-        realness[row[0]] = int(row[1])
-
-with open("analysis/wordlist2.txt") as f:
-    for line in f.readlines():
-        if " " in line:
-            [word, definition] = line.split(" ", 1)
-            word = word.lower()
-            definition = definition.strip()
-            definitions[word] = definition
-            if 3 <= len(word) <= 12:
-                if word not in realness:
-                    realness[word] = 5
-
-with open("analysis/wordlist1.txt") as f:
-    for line in f.readlines():
-        if "\t" in line:
-            [word, definition] = line.split("\t", 1)
-            word = word.lower()
-            definition = definition.strip()
-            if 3 <= len(word) <= 12:
-                if word not in realness:
-                    realness[word] = 5
-
-with open("analysis/grids.json") as f:
-    good = json.load(f)
+lexicon = load_lexicon()
+
+good = load_grids()
+templates = compile_grids(good)
+
+# Try the grids that have most often had solutions first. The order is fixed
+# for the whole run (so parallel and serial runs agree), and the statistics
+# gathered during the run are saved for the next one.
+grid_stats = load_grid_stats(len(good))
+grid_order = grid_stats.order()
 
 with open("analysis/rolls.txt") as f:
     current_rolls = [r.strip() for r in f.readlines() if len(r.strip()) == 12]
 
-with open("analysis/stored_solutions.json") as f:
-    stored_solutions = json.load(f)
+# Solutions found in earlier runs. Each roll's entry is expanded into the
+# stored_solutions.json format when it's looked up, and written as soon as it
+# changes.
+stored_solutions = load_solution_store()
 
 
-def is_possible(word, letters):
-    """Determine if `word` can be made using the set of letters in `letters`."""
-    if len(word) < 3:
-        return False
-    for letter in "abcdefghijklmnopqrstuvwxyz":
-        if word.count(letter) > letters.count(letter):
-            return False
-    return True
+# The `RollContext` of the last roll looked at, so `prioritize` and
+# `all_solutions` on the same roll share its word lists and indices.
+last_context = {}
+
+
+def roll_context(letters):
+    """
+    Get the `RollContext` of `letters`, reusing the last one if it's the same
+    roll.
+    """
+    if letters not in last_context:
+        last_context.clear()
+        last_context[letters] = RollContext(lexicon, letters)
+    return last_context[letters]
 
 
 def get_possible(letters, threshold=5):
@@ -64,10 +65,7 @@ def get_possible(letters, threshold=5):
     how well-known / legit a word is, to ensure no obscure or dubious words are
     needed to solve the Q-less roll.)
     """
-    return [
-        word for word in realness
-        if (realness[word] >= threshold) and is_possible(word, letters)
-    ]
+    return lexicon.get_possible(letters, threshold)
 
 
 def prioritize(letters, threshold=5):
@@ -76,26 +74,8 @@ def prioritize(letters, threshold=5):
     as long as their "realness" is above `threshold`. Results should be ordered so
     words with less common letters are earlier in the list.
     """
-    words = get_possible(letters, threshold)
-    available = {
-        letter: letters.count(letter) for letter in letters
-    }
-    avg_occurrence = sum([len(w) for w in words]) / len(set([l for l in letters]))
-    need = {
-        letter: avg_occurrence - sum([w.count(letter) for w in words]) / available[letter] for letter in available
-    }
-    return sorted(words,
-                  key=lambda w: sum([need[l] for l in w]),
-                  reverse = True)
-
+    return roll_context(letters).prioritized(threshold)
 
-def can_intersect(test_index, with_index, test_word, with_word):
-    """
-    Return true if `test_word` can intersect `with_word`, if they meet at
-    index `test_index` in `test_word` and `with_index` in `with_word`.
-    """
-    return test_word[test_index] == with_word[with_index]
-  
 
 def generate_roll():
     """
@@ -112,22 +92,7 @@ def generate_roll():
         )
     return "".join(
         sorted(
-            [random.choice([face for face in die]) for die in
-                [
-                    "aeiouu",
-                    "aaeeoo",
-                    "iionny",
-                    "nnrrhh",
-                    "wrflld",
-                    "hhpttw",
-                    "ppvfgk",
-                    "ggldrr",
-                    "ccjtbd",
-                    "ccsttm",
-                    "szxnbk",
-                    "mmblly"
-                ]
-            ]
+            [random.choice([face for face in die]) for die in DICE]
         )
     )
 
@@ -149,104 +114,98 @@ def prettify(solution):
     return "\n".join(["".join(l) for l in grid]).rstrip()
 
 
-def all_from_grid(grid, letters, words):
-    """
-    Get all valid solutions from `grid`, given the set of letters in the roll
-    (`letters`) and all legal words that can be formed from them (`words`).
-    """
-    j = 0
-    for line in grid:
-        if "word" not in line:
-            break
-        j += 1
-    if "word" in line:
-        return [grid]
-    candidates = [w for w in words if len(w) == line['length']]
-    constraints = [l for l in line['intersects'] if l[0] < j]
-    letters_present = "".join([grid[l[0]]['word'][l[2]] for l in constraints])
-    for l in constraints:
-        candidates = [w for w in candidates if can_intersect(l[1], l[2], w, grid[l[0]]['word'])]
-    results = []
-    for w in candidates:
-        new_grid = [g for g in grid]
-        new_grid[j] = {
-            **new_grid[j],
-            'word': w
-        }
-        new_letters = letters + letters_present
-        legal = True
-        for l in w:
-            if l not in new_letters:
-                legal = False
-                break
-            new_letters = "".join(new_letters.split(l, 1))
-        if legal:
-            results += all_from_grid(new_grid, new_letters, words)
-    return results
-
-
-def all_solutions(letters, threshold=5, stop_after=10):
+def all_solutions(letters, threshold=5, stop_after=10, stats=None):
     """
     Get all solutions to the roll given by `letters`, allowing only words with
     realness >= `threshold`, and stopping after `stop_after` solutions are
-    found.
+    found, starting from the roll's entry in the solution store (see
+    `all_solutions` in qless_search). Returns the roll's new entry for the
+    solution store and a list of (grid index, search nodes, solutions found)
+    for each grid searched.
     """
     letters = letters.lower()
-    words = prioritize(letters, threshold)
-    grids_tried = 0
-    solutions = []
-    # Check all solutions stored in stored_solutions.json, to see if they are
-    # all still legal for this grid. (If this grid has been solved before.)
-    if letters in stored_solutions:
-        grids_tried = stored_solutions[letters]['max_grid_tried']
-        for solution in stored_solutions[letters]['solutions']:
-            if all([line['word'] in words for line in solution]):
-                solutions.append(solution)
-            for line in solution:
-                words_used.add(line['word'])
-    for grid in good[grids_tried:]:
-        if len(solutions) >= stop_after:
-            return solutions, grids_tried
-        solutions += all_from_grid(grid, letters, words)
-        grids_tried += 1
-    return solutions, grids_tried
+    stored = stored_solutions[letters] if letters in stored_solutions else None
+    return qless_search.all_solutions(roll_context(letters), templates,
+                                      grid_order, threshold, stop_after, stats,
+                                      stored, ENGINE)
+
+
+def next_rolls():
+    """
+    Yield rolls to check: first the ones left over in rolls.txt, then newly
+    generated ones.
+    """
+    while True:
+        if len(current_rolls) > 0:
+            yield current_rolls.pop()
+        else:
+            yield generate_roll()
+
+
+def screen_roll(roll):
+    """
+    Find solutions for `roll`, with the stats of the search if profiling. Run
+    in a worker process in parallel mode.
+    """
+    stats = SearchStats() if PROFILE else None
+    return (roll, *all_solutions(roll, 5, stats=stats), stats)
+
 
 rolls = []
 words_used = set()
+profile = SearchStats()
 
 # Generate rolls and find their solutions until enough have been found.
-while len(rolls) < NUM_ROLLS:
-    if len(current_rolls) > 0:
-        roll = current_rolls.pop()
-    else:
-        roll = generate_roll()
-    solutions5, grids_tried5 = all_solutions(roll, 5)
+for roll, entry, attempts, stats in ordered_imap(screen_roll, next_rolls(), PROCESSES):
+    if stats is not None:
+        profile.merge(stats)
+    grid_stats.decay()
+    for grid, nodes, found in attempts:
+        grid_stats.record(grid, nodes, found > 0)
+    solutions5 = entry['solutions']
+    if roll in stored_solutions:
+        for s in stored_solutions[roll]['solutions']:
+            for line in s:
+                words_used.add(line['word'])
     for s in solutions5[:25]:
         for line in s:
             words_used.add(line['word'])
     if len(solutions5) > 0:
-        rolls.append((roll, len(solutions5), grids_tried5))
-        stored_solutions[roll] = {
-            'solutions': solutions5,
-            'max_grid_tried': grids_tried5
-        }
+        rolls.append((roll, len(solutions5), entry['max_grid_tried']))
+        stored_solutions[roll] = entry
     elif roll in stored_solutions:
         del stored_solutions[roll]
-
-rolls = sorted(rolls, key=lambda x: x[2], reverse=True)
+    if len(rolls) >= NUM_ROLLS:
+        break
+
+# The rolls that needed the most grids tried come first, as a rough measure of
+# how hard they are. The board search covers every grid at once, so it has no
+# such measure, and its rolls are left in the order they were screened.
+if ENGINE == "grids":
+    rolls = sorted(rolls, key=lambda x: x[2], reverse=True)
 print(rolls)
 
+if PROFILE:
+    print(f"{profile.nodes} nodes, {profile.letter_failures} letter check failures, "
+          f"{profile.lookahead_failures} forward check failures")
+    print(f"Candidates ruled out by each constraint: {profile.filtered}")
+    for grid, (searches, nodes, seconds, found) in profile.hottest(20):
+        print(f"Grid {grid}: {seconds:.3f} s, {nodes} nodes, {searches} searches, {found} solutions")
+
 with open("analysis/rolls.txt", "w") as f:
     f.writelines([r[0] + "\n" for r in rolls])
 
 # Write to file any words without a "realness" score, with definitions, so I
-# can assign their realness score.
+# can assign their realness score. The words that the most stored rolls
+# depend on for all their solutions come first, since those matter most.
+impact = WordImpactIndex(stored_solutions, follow=False)
 with open("analysis/new_words.csv", "w") as f:
-    for word in sorted(words_used, key=lambda x: len(x)):
-        if realness[word] == 5:
-            f.write(f"{word},,\"{definitions[word]}\"\n")
-
-# Write all found solutions to file to save work if the same rolls are done
-# after assigning new realness scores.
-with open("analysis/stored_solutions.json", "w") as f:
-    json.dump(stored_solutions, f)
\ No newline at end of file
+    for word in sorted(words_used, key=lambda x: (-impact.impact(x), len(x))):
+        if lexicon.realness_of(word) == 5:
+            f.write(f"{word},,\"{lexicon.definition(word)}\"\n")
+
+# Found solutions were saved as each roll was screened, to save work if the
+# same rolls are done after assigning new realness scores.
+stored_solutions.close()
+
+grid_stats.save()
@@ -0,0 +1,121 @@
+import json
+import os
+
+from qless_dice import enumerate_rolls, num_outcomes
+from qless_grids import load_grid_stats, load_grids
+from qless_lexicon import load_lexicon
+from qless_parallel import ordered_imap
+from qless_solver import RollContext, compile_grids, search
+
+# Settings
+THRESHOLD = 5  # minimum realness of words allowed in solutions
+STOP_AFTER = 10  # stop searching a roll after finding this many solutions
+MAX_ROLLS = 10000  # number of rolls to sweep this run (None to sweep them all)
+BATCH_SIZE = 100  # number of rolls between writes to the results file
+PROCESSES = os.cpu_count()  # number of worker processes to solve rolls with
+
+# Every distinct roll the real dice can make is swept in alphabetical order,
+# and one line is appended per roll to this file. The last roll in the file is
+# where the next run picks up from.
+RESULTS_PATH = "analysis/roll_sweep.jsonl"
+READ_BLOCK = 4096  # bytes read at a time from the end of the results file
+
+lexicon = load_lexicon()
+good = load_grids()
+templates = compile_grids(good)
+grid_order = load_grid_stats(len(good)).order()
+
+
+def last_swept(path=RESULTS_PATH):
+    """
+    Get the last roll recorded in the results file, or None if there isn't
+    one. If the last line was only partly written, it is removed. Only the
+    end of the file is read, going back a block at a time until a whole line
+    has been found.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        tail = b""
+        while True:
+            # The last line is the text after the last newline that has
+            # something after it.
+            start = max(end - len(tail) - READ_BLOCK, 0)
+            f.seek(start)
+            tail = f.read(end - start)
+            stripped = tail.rstrip(b"\n")
+            newline = stripped.rfind(b"\n")
+            if newline >= 0 or start == 0:
+                break
+        if len(stripped) == 0:
+            return None
+        line_start = start + newline + 1
+        try:
+            return json.loads(stripped[newline + 1:])['roll']
+        except ValueError:
+            f.truncate(line_start)
+    return last_swept(path)
+
+
+def sweep_roll(item):
+    """
+    Search for solutions to a roll, given as (roll, number of ways to roll
+    it). Run in a worker process in parallel mode.
+    """
+    roll, ways = item
+    roll_index = RollContext(lexicon, roll).index(THRESHOLD)
+    num_solutions = 0
+    grids_tried = 0
+    first = None
+    for i in grid_order:
+        if num_solutions >= STOP_AFTER:
+            break
+        solutions, _ = search(templates[i], roll_index, roll,
+                              limit=STOP_AFTER - num_solutions)
+        grids_tried += 1
+        if first is None and len(solutions) > 0:
+            first = {
+                'grid': i,
+                'words': [roll_index.words[w] for w in solutions[0]]
+            }
+        num_solutions += len(solutions)
+    return {
+        'roll': roll,
+        'ways': ways,
+        'probability': ways / num_outcomes(),
+        'solutions': num_solutions,
+        'grids_tried': grids_tried,
+        'first': first
+    }
+
+
+def rolls_to_sweep(start_after):
+    """Yield the next (roll, ways) pairs to sweep, up to MAX_ROLLS of them."""
+    for n, item in enumerate(enumerate_rolls(start_after=start_after)):
+        if MAX_ROLLS is not None and n >= MAX_ROLLS:
+            return
+        yield item
+
+
+start_after = last_swept()
+print(f"Resuming after {start_after}" if start_after else "Starting sweep")
+
+batch = []
+swept = 0
+solvable = 0
+for result in ordered_imap(sweep_roll, rolls_to_sweep(start_after), PROCESSES):
+    batch.append(result)
+    swept += 1
+    if result['solutions'] > 0:
+        solvable += 1
+    if len(batch) >= BATCH_SIZE:
+        with open(RESULTS_PATH, "a") as f:
+            f.writelines([json.dumps(r) + "\n" for r in batch])
+        batch = []
+        print(f"{swept} rolls swept, up to {result['roll']}")
+
+with open(RESULTS_PATH, "a") as f:
+    f.writelines([json.dumps(r) + "\n" for r in batch])
+
+print(f"{swept} rolls swept this run, {solvable} solvable")
@@ -0,0 +1,256 @@
+import itertools
+
+from qless_board import iter_board_search, to_solution
+from qless_lexicon import rated_since
+from qless_solver import (
+    SearchStats, iter_search, iter_search_including, search, search_descending
+)
+
+# The searches that qless_roll_finder, qless_init and qless_benchmark run for
+# a roll. Those scripts do their work when they're run, so the searches are
+# kept here, where they can all import them and the benchmark measures the
+# same code the scripts run.
+
+
+def all_from_grid(template, letters, roll_index, required=None, limit=None,
+                  stats=None):
+    """
+    Get all valid solutions from `template`, given the set of letters in the
+    roll (`letters`) and an index of all legal words that can be formed from
+    them (`roll_index`). If `required` is given, only get the solutions that
+    use at least one of the words in that bitset. If `limit` is given, stop
+    once that many are found. Also returns the number of search nodes visited.
+    The work done is added to `stats` (a `SearchStats`), if given.
+
+    Solutions are built straight from the search as it finds them, and the
+    search stops as soon as there are `limit` of them.
+    """
+    counts = SearchStats() if stats is None else stats
+    before = counts.nodes
+    if required is None:
+        run = iter_search(template, roll_index, letters, stats=counts)
+    else:
+        run = iter_search_including(template, roll_index, letters, required, counts)
+    solutions = [
+        template.solution(roll_index.words, assignment)
+        for assignment in itertools.islice(run, limit)
+    ]
+    run.close()
+    return solutions, counts.nodes - before
+
+
+def solution_key(solution):
+    """
+    Get a hashable key identifying `solution` (with its slots in any order),
+    for spotting duplicates.
+    """
+    return tuple(sorted((line['word'], *line['start'], line['down']) for line in solution))
+
+
+def stored_grids_tried(stored):
+    """Get the bitset of grids already tried for a solution store entry."""
+    if 'tried' in stored:
+        return int(stored['tried'], 16)
+    # Entries from before grids were tried best-first tried a prefix of them.
+    return (1 << stored['max_grid_tried']) - 1
+
+
+def newly_legal(stored, words, lexicon):
+    """
+    Get the words of `words` (a roll's legal words in `lexicon`) that the
+    grids tried for a solution store entry may not have been searched with:
+    those rated since the lexicon version the entry was searched at (see
+    `rated_since`). If the lexicon has changed in any other way since, or the
+    entry is from before the version was stored, it could be any of them.
+    """
+    rated = rated_since(stored.get('lexicon_version'))
+    if rated is None or lexicon.version is None:
+        return set(words)
+    return set(words) & rated
+
+
+def store_entry(solutions, tried, version):
+    """
+    Get a roll's entry for the solution store, with `tried` the bitset of
+    grids tried and `version` the lexicon version they were all fully searched
+    at (if there is one).
+    """
+    entry = {
+        'solutions': solutions,
+        'max_grid_tried': bin(tried).count("1"),
+        'tried': format(tried, "x")
+    }
+    if version is not None:
+        entry['lexicon_version'] = version
+    return entry
+
+
+def all_solutions(context, templates, grid_order, threshold=5, stop_after=10,
+                  stats=None, stored=None, engine="grids"):
+    """
+    Get all solutions to the roll of `context` (a `RollContext`), allowing
+    only words with realness >= `threshold`, and stopping after `stop_after`
+    solutions are found. The grids in `templates` are tried in the order of
+    `grid_order`, and each grid's search stops as soon as there are enough
+    solutions. A grid whose search was cut short isn't counted as tried, so a
+    later run searches it again. With the "board" `engine`, the grids are
+    skipped for a search of every crossword shape, which counts as trying
+    every grid if it runs to the end.
+
+    `stored` is the roll's entry in the solution store, if it has one. Its
+    solutions that are still legal are kept, and grids it has tried are only
+    searched again for solutions using words that have become legal since.
+
+    Returns the roll's new entry for the solution store, which also records
+    which grids have been tried and the lexicon version that every one of them
+    has been fully searched at (see `newly_legal`). Also returns a list of
+    (grid index, search nodes, solutions found) for each grid searched. If
+    `stats` (a `SearchStats`) is given, all the searches are recorded in it.
+    """
+    letters = context.letters
+    words = context.prioritized(threshold)
+    roll_index = context.index(threshold)
+    if stats is not None:
+        stats.threshold = threshold
+    tried = 0
+    solutions = []
+    seen = set()
+    version = context.lexicon.version
+    attempts = []
+
+    def add(found):
+        """Add the solutions in `found` that aren't already known."""
+        for solution in found:
+            if solution_key(solution) not in seen:
+                seen.add(solution_key(solution))
+                solutions.append(solution)
+
+    # Check all solutions in the solution store, to see if they are
+    # all still legal for this grid. (If this grid has been solved before.)
+    if stored is not None:
+        tried = stored_grids_tried(stored)
+        add([
+            solution for solution in stored['solutions']
+            if all([line['word'] in roll_index.ids for line in solution])
+        ])
+        added = newly_legal(stored, words, context.lexicon)
+
+    # The board search covers every shape, so once it's run to the end, every
+    # grid has been tried with every legal word, and it only needs to run
+    # again if there are new legal words.
+    if engine == "board":
+        every_grid = (1 << len(templates)) - 1
+        complete = stored is not None and tried == every_grid and not added
+        if len(solutions) < stop_after and not complete:
+            complete = True
+            run = iter_board_search(words, letters, stats)
+            for placed in run:
+                add([to_solution(placed)])
+                if len(solutions) >= stop_after:
+                    complete = False
+                    break
+            run.close()
+        if complete:
+            tried = every_grid
+        elif stored is not None:
+            version = stored.get('lexicon_version')
+        return store_entry(solutions, tried, version), attempts
+
+    if stored is not None:
+        # The grids already tried only need to be searched again for
+        # solutions using a word that may have become legal since, and only
+        # until there are enough solutions. Until they have been, the entry
+        # keeps the version they were searched at.
+        complete = True
+        if added:
+            required = roll_index.bitset(added)
+            for i in grid_order:
+                if not (tried >> i) & 1:
+                    continue
+                if len(solutions) >= stop_after:
+                    complete = False
+                    break
+                limit = stop_after - len(solutions)
+                found, _ = all_from_grid(templates[i], letters, roll_index,
+                                         required, limit, stats)
+                add(found)
+                if len(found) >= limit:
+                    complete = False
+                    break
+        if not complete:
+            version = stored.get('lexicon_version')
+    for i in grid_order:
+        if (tried >> i) & 1:
+            continue
+        if len(solutions) >= stop_after:
+            break
+        limit = stop_after - len(solutions)
+        found, nodes = all_from_grid(templates[i], letters, roll_index,
+                                     limit=limit, stats=stats)
+        attempts.append((i, nodes, len(found)))
+        add(found)
+        if len(found) < limit:
+            tried |= 1 << i
+    return store_entry(solutions, tried, version), attempts
+
+
+def try_grid(template, letters, roll_index, stats=None, threshold=None, descending=False):
+    """
+    Get the first solution found in `template`, or None if it has none. With
+    `threshold`, only words with at least that realness are used, and with
+    `descending` too, the grid is taken to have already failed at
+    threshold + 1 (see `search_descending`).
+    """
+    if descending:
+        solutions, nodes = search_descending(template, roll_index, letters, threshold, limit=1, stats=stats)
+    elif threshold is not None:
+        masks = [roll_index.at_least(threshold)] * len(template.grid)
+        solutions, nodes = search(template, roll_index, letters, limit=1, masks=masks, stats=stats)
+    else:
+        solutions, nodes = search(template, roll_index, letters, limit=1, stats=stats)
+    if len(solutions) == 0:
+        return None
+    return template.solution(roll_index.words, solutions[0])
+
+
+def iter_solve(context, templates, ordering, threshold=5, end_threshold=1,
+               skip=(), stats=None, descend=False):
+    """
+    Search the grids in `templates` for a solution to the roll of `context`
+    (a `RollContext`), as qless_init's `solve` does: every grid in `ordering`
+    at `threshold`, except those in `skip`, then all of them again at each
+    lower threshold down to `end_threshold`. Yields (grid index, threshold,
+    solution or None, search nodes) for each grid searched, so the caller
+    decides when to stop.
+
+    With `descend`, one roll index tagged with realness is built for all the
+    thresholds, and each lower threshold only searches the branches that use
+    a word it newly allows, since every grid already failed without them.
+    That relies on every grid having failed at the threshold above, so the
+    grids in `skip` must have failed at `threshold` itself, not just at some
+    higher threshold. `descend` is opt-in. Either way, a solution found
+    earlier has the highest realness possible.
+    """
+    letters = context.letters
+    counts = SearchStats() if stats is None else stats
+    counts.threshold = threshold
+    if descend:
+        roll_index = context.index(min(threshold, end_threshold), tagged=True)
+        first_threshold = threshold
+    else:
+        roll_index = context.index(threshold)
+        first_threshold = None
+    for i in ordering:
+        if i not in skip:
+            nodes = counts.nodes
+            solution = try_grid(templates[i], letters, roll_index, counts, first_threshold)
+            yield i, threshold, solution, counts.nodes - nodes
+    for lower in range(threshold - 1, end_threshold - 1, -1):
+        counts.threshold = lower
+        if not descend:
+            roll_index = context.index(lower)
+        for i in ordering:
+            nodes = counts.nodes
+            solution = try_grid(templates[i], letters, roll_index, counts,
+                                lower if descend else None, descend)
+            yield i, lower, solution, counts.nodes - nodes
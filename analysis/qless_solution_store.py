@@ -0,0 +1,236 @@
+import json
+import os
+
+SOLUTIONS_PATH = "analysis/solutions.jsonl"
+STORED_SOLUTIONS_PATH = "analysis/stored_solutions.json"
+
+# The solution store is a file with one JSON object per line, only ever
+# appended to (until it's compacted). Words and grids are written once each,
+# to tables that grow as new ones come up, and solutions refer to them by
+# their position in those tables:
+# - {"words": [...]} adds words to the word table
+# - {"grids": [...]} adds grids to the grid table, each as a list of its
+#   slots, with each slot as [start row, start column, length, down,
+#   intersects] (the same values as in grids.json)
+# - {"roll": ..., "solutions": [[grid, [word, ...]], ...], "tried": ...,
+#   "max_grid_tried": ..., "lexicon_version": ...} is a roll's entry,
+#   replacing any earlier one for that roll
+# - {"roll": ..., "deleted": true} removes a roll's entry
+# The store's tables are its own, so it doesn't depend on the order of the
+# lexicon or grids.json, which both change.
+
+# Compact the file when closing it if it has at least this many times as many
+# lines as rolls (so most of them are replaced entries).
+COMPACT_RATIO = 2
+
+
+def grid_key(grid):
+    """Get a hashable key identifying a grid by where its slots are."""
+    return tuple((*line['start'], line['length'], line['down']) for line in grid)
+
+
+def pack_grid(grid):
+    """Get the grid table form of `grid` (in the grids.json format)."""
+    return [[*line['start'], line['length'], int(line['down']), line['intersects']]
+            for line in grid]
+
+
+def unpack_grid(slots):
+    """Get a grid in the grids.json format from its grid table form."""
+    return [
+        {
+            'start': [row, column],
+            'length': length,
+            'down': bool(down),
+            'intersects': intersects
+        }
+        for row, column, length, down, intersects in slots
+    ]
+
+
+class SolutionStore:
+    """
+    The stored solutions of every roll screened so far, keyed by roll, in a
+    solution store file (see above). Entries are read in their compact form,
+    and are expanded into the stored_solutions.json format (with each solution
+    a list of grid slot dicts with a 'word' added) only when a roll is looked
+    up. Setting or deleting a roll's entry appends a line to the file, instead
+    of writing out the whole thing again.
+
+    If given, `on_change(roll)` is called whenever a roll's entry is set or
+    deleted (including when the file is compacted).
+    """
+
+    def __init__(self, path=SOLUTIONS_PATH, on_change=None):
+        self.path = path
+        self.on_change = on_change
+        self.words = []
+        self.word_ids = {}
+        self.grids = []
+        self.grid_ids = {}
+        self.entries = {}
+        self.lines = 0
+        if os.path.exists(path):
+            self._read()
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            lines = f.read().split(b"\n")
+        complete = [l for l in lines if len(l) > 0]
+        for n, line in enumerate(complete):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Only the last line can be broken, by a run stopped mid-write.
+                if n < len(complete) - 1:
+                    raise
+                with open(self.path, "wb") as f:
+                    f.write(b"".join(l + b"\n" for l in complete[:-1]))
+                break
+            self._apply(record)
+
+    def _apply(self, record):
+        self.lines += 1
+        if 'roll' not in record:
+            for word in record.get('words', []):
+                self.word_ids[word] = len(self.words)
+                self.words.append(word)
+            for slots in record.get('grids', []):
+                grid = unpack_grid(slots)
+                self.grid_ids[grid_key(grid)] = len(self.grids)
+                self.grids.append(grid)
+        else:
+            if record.get('deleted'):
+                self.entries.pop(record['roll'], None)
+            else:
+                self.entries[record['roll']] = record
+            if self.on_change is not None:
+                self.on_change(record['roll'])
+
+    def _write(self, records):
+        with open(self.path, "a") as f:
+            f.writelines([json.dumps(r) + "\n" for r in records])
+
+    def _encode(self, roll, entry):
+        """
+        Get the compact form of `entry`, with the records to write first for
+        any words and grids that aren't in the tables yet.
+        """
+        new_words = {}
+        new_grids = {}
+
+        def word_id(word):
+            if word in self.word_ids:
+                return self.word_ids[word]
+            return new_words.setdefault(word, len(self.words) + len(new_words))
+
+        def grid_id(grid):
+            key = grid_key(grid)
+            if key in self.grid_ids:
+                return self.grid_ids[key]
+            if key not in new_grids:
+                new_grids[key] = (len(self.grids) + len(new_grids), pack_grid(grid))
+            return new_grids[key][0]
+
+        record = {
+            'roll': roll,
+            'solutions': [
+                [grid_id(solution), [word_id(line['word']) for line in solution]]
+                for solution in entry['solutions']
+            ],
+            **{k: v for k, v in entry.items() if k != 'solutions'}
+        }
+        tables = {}
+        if len(new_words) > 0:
+            tables['words'] = list(new_words)
+        if len(new_grids) > 0:
+            tables['grids'] = [grid for _, grid in new_grids.values()]
+        return ([tables] if len(tables) > 0 else []) + [record]
+
+    def __contains__(self, roll):
+        return roll in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, roll):
+        """Get a roll's entry, in the stored_solutions.json format."""
+        record = self.entries[roll]
+        entry = {k: v for k, v in record.items() if k != 'roll'}
+        entry['solutions'] = [
+            [
+                {**line, 'word': self.words[w]}
+                for line, w in zip(self.grids[grid], words)
+            ]
+            for grid, words in record['solutions']
+        ]
+        return entry
+
+    def __setitem__(self, roll, entry):
+        """Replace a roll's entry with `entry` (in the stored_solutions.json format)."""
+        self.update({roll: entry})
+
+    def __delitem__(self, roll):
+        if roll not in self.entries:
+            raise KeyError(roll)
+        record = {'roll': roll, 'deleted': True}
+        self._apply(record)
+        self._write([record])
+
+    def update(self, entries):
+        """Set the entries of many rolls at once, with a single write."""
+        records = []
+        for roll, entry in entries.items():
+            encoded = self._encode(roll, entry)
+            # Later entries need the tables from earlier ones.
+            for record in encoded:
+                self._apply(record)
+            records += encoded
+        self._write(records)
+
+    def compact(self):
+        """
+        Rewrite the file with only the current entry of each roll, and only
+        the words and grids they use.
+        """
+        entries = {roll: self[roll] for roll in self.entries}
+        self.words = []
+        self.word_ids = {}
+        self.grids = []
+        self.grid_ids = {}
+        self.entries = {}
+        self.lines = 0
+        path = self.path
+        self.path = path + ".tmp"
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.update(entries)
+        os.replace(self.path, path)
+        self.path = path
+
+    def close(self):
+        """Compact the file if most of it is replaced entries."""
+        if self.lines >= COMPACT_RATIO * max(len(self.entries), 1) + 2:
+            self.compact()
+
+
+def load_solution_store(path=SOLUTIONS_PATH, json_path=STORED_SOLUTIONS_PATH):
+    """
+    Open the solution store at `path`, first converting the old
+    stored_solutions.json at `json_path` into it if there isn't one yet.
+    """
+    store = SolutionStore(path)
+    if not os.path.exists(path) and os.path.exists(json_path):
+        with open(json_path) as f:
+            store.update(json.load(f))
+    return store
+
+
+if __name__ == "__main__":
+    store = load_solution_store()
+    store.compact()
+    print(f"{len(store)} rolls, {len(store.words)} words and {len(store.grids)} "
+          f"grids in {SOLUTIONS_PATH}")
@@ -0,0 +1,568 @@
+import itertools
+import time
+
+import numpy as np
+
+from qless_lexicon import ALPHABET, letter_counts
+
+# The least common multiple of 1 to 12 (the most copies of a letter a roll can
+# have), so scarcity keys can be computed exactly in integers.
+SCARCITY_SCALE = 27720
+
+
+class Slot:
+    """
+    One word-slot of a compiled grid template, where `index` is its position in
+    the grid. `constraints` lists every intersection with a slot filled before
+    it as (position in this slot, other slot, position in other slot), and
+    `free_positions` are the positions whose letters must come from the roll
+    rather than an intersecting word.
+    """
+
+    def __init__(self, line, index, earlier):
+        self.index = index
+        self.length = line['length']
+        self.constraints = tuple(
+            (position, other, other_position)
+            for other, position, other_position in line['intersects']
+            if other in earlier
+        )
+        constrained = set(c[0] for c in self.constraints)
+        self.free_positions = tuple(
+            i for i in range(self.length) if i not in constrained
+        )
+
+
+class Template:
+    """
+    A grid from grids.json compiled once into slots, so searching it for many
+    rolls doesn't re-derive which intersections apply at each step. `slots`
+    are in the order they are filled, which is the grid's own order unless
+    `order` (a list of slot indices) is given.
+    """
+
+    def __init__(self, grid, index=None, order=None):
+        self.grid = grid
+        self.index = index
+        if order is None:
+            order = range(len(grid))
+        self.slots = []
+        for j in order:
+            self.slots.append(Slot(grid[j], j, set(s.index for s in self.slots)))
+        self._starting_with = {}
+
+        # For forward checking: after the slot at each step is filled, the
+        # later slots to check, as (step, pinned intersections, positions
+        # whose letters still have to come from the roll).
+        self.lookahead = []
+        for j in range(len(self.slots)):
+            placed = set(s.index for s in self.slots[:j + 1])
+            checks = []
+            for k in range(j + 1, len(self.slots)):
+                pinned = tuple(c for c in self.slots[k].constraints if c[1] in placed)
+                unpinned = tuple(
+                    i for i in range(self.slots[k].length)
+                    if i not in set(c[0] for c in pinned)
+                )
+                checks.append((k, pinned, unpinned))
+            self.lookahead.append(checks)
+
+    def starting_with(self, first):
+        """Get this template with slot `first` filled before all the others."""
+        if first not in self._starting_with:
+            order = [first] + [i for i in range(len(self.grid)) if i != first]
+            self._starting_with[first] = Template(self.grid, self.index, order)
+        return self._starting_with[first]
+
+    def solution(self, words, assignment):
+        """
+        Build a solution in the same shape as the grid (a list of slot dicts,
+        each with a 'word' added) from a list of word indices into `words`.
+        """
+        return [
+            {**line, 'word': words[w]} for line, w in zip(self.grid, assignment)
+        ]
+
+
+def by_scarcity(words, letters):
+    """
+    Sort `words` (the legal words for the roll `letters`) so words with less
+    common letters are earlier in the list, since those are the hardest to
+    fit into a grid and so should be tried first.
+    """
+    available = {
+        letter: letters.count(letter) for letter in letters
+    }
+    avg_occurrence = sum([len(w) for w in words]) / len(set([l for l in letters]))
+    need = {
+        letter: avg_occurrence - sum([w.count(letter) for w in words]) / available[letter] for letter in available
+    }
+    return sorted(words,
+                  key=lambda w: sum([need[l] for l in w]),
+                  reverse = True)
+
+
+def scarcity_order(counts, letters):
+    """
+    Get the order `by_scarcity` sorts words into, from the (words x 26) matrix
+    of their letter counts, with array operations instead of a Python sum per
+    word and letter. The keys are scaled up to be exact integers, so words
+    with equal keys (like anagrams) always stay in the order they were given,
+    where `by_scarcity` orders them by floating-point rounding.
+    """
+    if len(counts) == 0:
+        return np.arange(0)
+    available = letter_counts(letters).astype(np.int64)
+    present = available > 0
+    totals = counts.sum(axis=0, dtype=np.int64)
+    # need[l] = total length / letters in roll - total uses of l / copies of l
+    need = (totals.sum() * SCARCITY_SCALE -
+            totals * (SCARCITY_SCALE * present.sum() // np.where(present, available, 1)))
+    keys = counts.astype(np.int64) @ np.where(present, need, 0)
+    return np.argsort(-keys, kind="stable")
+
+
+class RollContext:
+    """
+    What one roll needs for searching, worked out once and kept for every
+    threshold and grid: the legal words (found once at the lowest threshold
+    asked for, then filtered by realness for higher ones), the words in
+    priority order for each threshold, and the `RollIndex` of each.
+    """
+
+    def __init__(self, lexicon, letters):
+        self.lexicon = lexicon
+        self.letters = letters
+        self._ids = None
+        self._lowest = None
+        self._prioritized = {}
+        self._indexes = {}
+
+    def ids(self, threshold=5):
+        """Get the lexicon indices of the legal words at `threshold`."""
+        if self._lowest is None or threshold < self._lowest:
+            self._ids = self.lexicon.possible_ids(self.letters, threshold)
+            self._lowest = threshold
+        return self._ids[self.lexicon.realness[self._ids] >= threshold]
+
+    def prioritized(self, threshold=5):
+        """
+        Get the legal words at `threshold`, with the words with less common
+        letters first (see `by_scarcity`).
+        """
+        if threshold not in self._prioritized:
+            ids = self.ids(threshold)
+            order = scarcity_order(self.lexicon.counts[ids], self.letters)
+            self._prioritized[threshold] = [self.lexicon.words[i] for i in ids[order]]
+        return self._prioritized[threshold]
+
+    def index(self, threshold=5, tagged=False):
+        """
+        Get the `RollIndex` of the prioritized words at `threshold`, with the
+        words tagged with their realness if `tagged`.
+        """
+        key = (threshold, tagged)
+        if key not in self._indexes:
+            self._indexes[key] = RollIndex(
+                self.prioritized(threshold),
+                self.lexicon.realness_of if tagged else None
+            )
+        return self._indexes[key]
+
+
+class CompiledGrids:
+    """
+    The `Template` of each grid in `grids` (a `GridStore`, or a list of grids
+    in the grids.json format), each compiled the first time it's used. Nothing
+    is decoded or compiled up front, so a process (or forked worker) only
+    holds the templates of the grids it has actually searched.
+    """
+
+    def __init__(self, grids):
+        self.grids = grids
+        self.templates = {}
+
+    def __len__(self):
+        return len(self.grids)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("grid index out of range")
+        template = self.templates.get(i)
+        if template is None:
+            template = self.templates[i] = Template(self.grids[i], i)
+        return template
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def compile_grids(grids):
+    """
+    Get the `Template` of every grid in `grids`, compiled lazily (see
+    `CompiledGrids`).
+    """
+    return CompiledGrids(grids)
+
+
+class RollIndex:
+    """
+    Candidate indexes over the legal words for one roll. Each key of
+    `by_letter` is (length, position, letter) and each key of `by_length` is a
+    length, and both map to a bitset (a Python int) of word indices, so the
+    candidates for a slot are the intersection of a few bitsets. Bit order
+    follows `words`, so candidates come out in the order they were given.
+
+    If `realness` (a function from word to realness) is given, each word is
+    tagged with its realness, so one index built at the lowest threshold can
+    be searched at any higher one via `at_least`.
+    """
+
+    def __init__(self, words, realness=None):
+        self.words = list(words)
+        self.realness = None if realness is None else [realness(w) for w in self.words]
+        self._at_least = {}
+        self.ids = {w: i for i, w in enumerate(self.words)}
+        self.codes = [[ord(l) - ord("a") for l in w] for w in self.words]
+        by_length = {}
+        by_letter = {}
+        for i, w in enumerate(self.words):
+            by_length.setdefault(len(w), []).append(i)
+            for position, letter in enumerate(w):
+                by_letter.setdefault((len(w), position, letter), []).append(i)
+        self.by_length = {k: _bitset(v) for k, v in by_length.items()}
+        self.by_letter = {k: _bitset(v) for k, v in by_letter.items()}
+
+    def bitset(self, words):
+        """Get the bitset of the indices of those of `words` in this index."""
+        return _bitset(self.ids[w] for w in words if w in self.ids)
+
+    def at_least(self, threshold):
+        """Get the bitset of the words with realness >= `threshold`."""
+        if threshold not in self._at_least:
+            self._at_least[threshold] = _bitset(
+                i for i, r in enumerate(self.realness) if r >= threshold
+            )
+        return self._at_least[threshold]
+
+
+def _bitset(indices):
+    """Make a bitset with the bit for each of `indices` set."""
+    bits = 0
+    for i in indices:
+        bits |= 1 << i
+    return bits
+
+
+def letter_count_list(letters):
+    """Get a mutable list of how many times each letter appears in `letters`."""
+    return [letters.count(letter) for letter in ALPHABET]
+
+
+class SearchStats:
+    """
+    A record of the work done by one or more searches, for profiling. Pass the
+    same object to every search to be counted; nothing is shared between
+    searches otherwise, so separate searches (in threads or worker processes)
+    can each have their own and `merge` them afterwards.
+
+    `filtered` maps the number of a constraint within its slot (0 for the
+    first intersection checked, and so on) to the number of candidates it
+    ruled out, and `candidates` counts the candidates left to try, summed
+    over every search node (so `branching` is the average per node).
+    `letter_failures` counts candidates rejected for needing letters that
+    were used up, and `lookahead_failures` words rejected by forward
+    checking. `grids` maps each grid index to [searches, nodes,
+    seconds, solutions]. `threshold` is for the caller to set to the realness
+    threshold it got down to.
+
+    If given, `on_solution(template, assignment)` is called for each solution
+    found, and `on_grid(template, nodes, seconds, solutions)` after each
+    search of a grid. Both are left out when pickling, so a worker process's
+    stats can be sent back without them.
+    """
+
+    def __init__(self, on_solution=None, on_grid=None):
+        self.nodes = 0
+        self.filtered = {}
+        self.candidates = 0
+        self.letter_failures = 0
+        self.lookahead_failures = 0
+        self.solutions = 0
+        self.grids = {}
+        self.threshold = None
+        self.on_solution = on_solution
+        self.on_grid = on_grid
+
+    def record_grid(self, template, nodes, seconds, solutions):
+        """Record a finished search of `template`."""
+        counts = self.grids.setdefault(template.index, [0, 0, 0.0, 0])
+        counts[0] += 1
+        counts[1] += nodes
+        counts[2] += seconds
+        counts[3] += solutions
+        if self.on_grid is not None:
+            self.on_grid(template, nodes, seconds, solutions)
+
+    def merge(self, other):
+        """Add the counts from another `SearchStats` into this one."""
+        self.nodes += other.nodes
+        self.candidates += other.candidates
+        for n, count in other.filtered.items():
+            self.filtered[n] = self.filtered.get(n, 0) + count
+        self.letter_failures += other.letter_failures
+        self.lookahead_failures += other.lookahead_failures
+        self.solutions += other.solutions
+        for grid, counts in other.grids.items():
+            mine = self.grids.setdefault(grid, [0, 0, 0.0, 0])
+            for k in range(len(mine)):
+                mine[k] += counts[k]
+        if other.threshold is not None:
+            self.threshold = other.threshold if self.threshold is None else min(self.threshold, other.threshold)
+
+    def branching(self):
+        """Get the average number of candidates per search node."""
+        return self.candidates / self.nodes if self.nodes > 0 else 0.0
+
+    def hottest(self, n=10):
+        """Get the `n` grids that took the most time, as (grid, counts) pairs."""
+        return sorted(self.grids.items(), key=lambda item: item[1][2], reverse=True)[:n]
+
+    def __getstate__(self):
+        return {**self.__dict__, 'on_solution': None, 'on_grid': None}
+
+
+def iter_search(template, roll_index, letters, masks=None, forward_check=True,
+                stats=None, required=None):
+    """
+    Yield the ways to fill `template` with words from `roll_index` using the
+    letters in `letters`, one at a time, as the search finds them. Each is
+    yielded as the search's own assignment list (word indices in the grid's
+    slot order), which changes as the search goes on, so use it (or copy it)
+    before asking for the next. Whatever isn't asked for is never searched.
+
+    If `masks` is given, it has a bitset (or None) for each slot of the grid,
+    and that slot may only use words in it. If `required` (a bitset) is given,
+    only solutions using at least one of its words are found, and until one is
+    placed, forward checking also cuts off branches where no slot left could
+    hold one.
+
+    The remaining letters are kept in a count array that is decremented when a
+    word is placed and restored when the search backtracks. With
+    `forward_check`, a word is only kept if every slot still to be filled has
+    at least one candidate that matches the letters already placed across it
+    and whose other letters are all still available. If `stats` (a
+    `SearchStats`) is given, the work done is added to it when the generator
+    is finished or closed (so its time includes any time spent between
+    solutions by whatever is consuming them).
+    """
+    start = time.perf_counter()
+    filtered = None if stats is None else stats.filtered
+    slots = template.slots
+    words = roll_index.words
+    codes = roll_index.codes
+    by_length = roll_index.by_length
+    by_letter = roll_index.by_letter
+    base = [by_length.get(slot.length, 0) for slot in slots]
+    if masks is not None:
+        base = [
+            b if masks[slot.index] is None else b & masks[slot.index]
+            for b, slot in zip(base, slots)
+        ]
+    remaining = letter_count_list(letters)
+    assignment = [0] * len(slots)
+    found = 0
+    nodes = 0
+    candidates = 0
+    letter_failures = 0
+    lookahead_failures = 0
+    lookahead = template.lookahead
+    need = required or 0
+
+    def viable(j):
+        """
+        Check that every slot after the next still has a candidate, and if a
+        required word is still needed, that some slot left could hold one.
+        (The next slot's own candidates are checked when it is filled.)
+        """
+        hosts = not need
+        for k, pinned, unpinned in lookahead[j]:
+            if k == j + 1 and hosts:
+                continue
+            length = slots[k].length
+            bits = base[k]
+            for position, other, other_position in pinned:
+                if not bits:
+                    return False
+                letter = words[assignment[other]][other_position]
+                bits &= by_letter.get((length, position, letter), 0)
+            if not hosts and bits & need:
+                hosts = True
+            if k == j + 1:
+                continue
+            while bits:
+                low = bits & -bits
+                bits ^= low
+                word_codes = codes[low.bit_length() - 1]
+                used = 0
+                fits = True
+                for position in unpinned:
+                    remaining[word_codes[position]] -= 1
+                    used += 1
+                    if remaining[word_codes[position]] < 0:
+                        fits = False
+                        break
+                for position in unpinned[:used]:
+                    remaining[word_codes[position]] += 1
+                if fits:
+                    break
+            else:
+                return False
+        return hosts
+
+    def place(j):
+        nonlocal nodes, found, candidates, letter_failures, lookahead_failures, need
+        nodes += 1
+        if j == len(slots):
+            if need:
+                return
+            found += 1
+            if stats is not None and stats.on_solution is not None:
+                stats.on_solution(template, assignment)
+            yield assignment
+            return
+        slot = slots[j]
+        bits = base[j]
+        for n, (position, other, other_position) in enumerate(slot.constraints):
+            if not bits:
+                return
+            letter = words[assignment[other]][other_position]
+            if filtered is None:
+                bits &= by_letter.get((slot.length, position, letter), 0)
+            else:
+                before = bits.bit_count()
+                bits &= by_letter.get((slot.length, position, letter), 0)
+                filtered[n] = filtered.get(n, 0) + before - bits.bit_count()
+        if filtered is not None:
+            candidates += bits.bit_count()
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            w = low.bit_length() - 1
+            word_codes = codes[w]
+            used = 0
+            for position in slot.free_positions:
+                remaining[word_codes[position]] -= 1
+                used += 1
+                if remaining[word_codes[position]] < 0:
+                    letter_failures += 1
+                    break
+            else:
+                assignment[slot.index] = w
+                satisfied = need and (need >> w) & 1
+                if satisfied:
+                    need = 0
+                if (not forward_check) or viable(j):
+                    yield from place(j + 1)
+                else:
+                    lookahead_failures += 1
+                if satisfied:
+                    need = required
+            for position in slot.free_positions[:used]:
+                remaining[word_codes[position]] += 1
+
+    try:
+        if not need or any(b & need for b in base):
+            yield from place(0)
+    finally:
+        if stats is not None:
+            stats.nodes += nodes
+            stats.candidates += candidates
+            stats.letter_failures += letter_failures
+            stats.lookahead_failures += lookahead_failures
+            stats.solutions += found
+            stats.record_grid(template, nodes, time.perf_counter() - start, found)
+
+
+def search(template, roll_index, letters, limit=None, masks=None,
+           forward_check=True, stats=None, required=None):
+    """
+    Find ways to fill `template` (see `iter_search`), stopping once `limit`
+    have been found (if given). Returns the solutions as lists of word indices
+    (in the grid's slot order), and the number of search nodes visited.
+    """
+    counts = SearchStats() if stats is None else stats
+    before = counts.nodes
+    run = iter_search(template, roll_index, letters, masks, forward_check,
+                      counts, required)
+    found = [list(assignment) for assignment in itertools.islice(run, limit)]
+    run.close()
+    return found, counts.nodes - before
+
+
+def iter_solutions(template, roll_index, letters, **options):
+    """
+    Yield the solutions found by `iter_search` (which takes the same
+    `options`) in the same shape as the grid (see `Template.solution`). Each
+    one is only built when it is asked for.
+    """
+    for assignment in iter_search(template, roll_index, letters, **options):
+        yield template.solution(roll_index.words, assignment)
+
+
+def iter_search_including(template, roll_index, letters, required,
+                          stats=None, allowed=None):
+    """
+    Like `iter_search`, but only yield solutions that use at least one word
+    from the bitset `required`. The search is split on which slot is the first
+    (in grid order) to hold a required word, so each solution is found exactly
+    once. That slot is filled first, so when there are few required words,
+    most of the search is cut off right away. If `allowed` is given, every
+    word used must also be in that bitset.
+    """
+    if allowed is None:
+        allowed = (1 << len(roll_index.words)) - 1
+    others = allowed & ~required
+    for k, line in enumerate(template.grid):
+        if not roll_index.by_length.get(line['length'], 0) & required:
+            continue
+        masks = [others] * k + [required] + [allowed] * (len(template.grid) - k - 1)
+        yield from iter_search(template.starting_with(k), roll_index, letters,
+                               masks, stats=stats)
+
+
+def search_including(template, roll_index, letters, required, limit=None,
+                     stats=None, allowed=None):
+    """
+    Find the solutions that `iter_search_including` would yield, stopping once
+    `limit` have been found (if given). Returns them and the number of search
+    nodes visited, like `search`.
+    """
+    counts = SearchStats() if stats is None else stats
+    before = counts.nodes
+    run = iter_search_including(template, roll_index, letters, required,
+                                counts, allowed)
+    found = [list(assignment) for assignment in itertools.islice(run, limit)]
+    run.close()
+    return found, counts.nodes - before
+
+
+def search_descending(template, roll_index, letters, threshold, limit=None,
+                      stats=None):
+    """
+    Search `template` using only the words with realness >= `threshold`, for
+    a roll index built with realness (see `RollIndex`), given that it has
+    already been fully searched at `threshold + 1` without a solution. Every
+    solution must then use a word with realness exactly `threshold`, so the
+    search requires one and cuts off the branches with no room left for it.
+    """
+    allowed = roll_index.at_least(threshold)
+    admitted = allowed & ~roll_index.at_least(threshold + 1)
+    if not admitted:
+        return [], 0
+    return search(template, roll_index, letters, limit,
+                  masks=[allowed] * len(template.grid), stats=stats,
+                  required=admitted)
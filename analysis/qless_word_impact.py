@@ -0,0 +1,121 @@
+import json
+
+from qless_solution_store import load_solution_store
+
+CANDIDATES_PATH = "analysis/candidates.json"
+
+
+class WordImpactIndex:
+    """
+    Which stored solutions depend on each word, over every roll in a
+    `SolutionStore`: for each word, the rolls with a stored solution that uses
+    it, and which of that roll's solutions they are (as a bitset). A roll
+    whose solutions all use a word is left with none if that word is rated
+    below the threshold, which is found from the bitsets without searching
+    anything again.
+
+    The index is built in one pass over the store's compact entries, and with
+    `follow` it keeps itself up to date as the store's entries change (see
+    `SolutionStore.on_change`). Words are kept as strings rather than the
+    store's word ids, since compacting the store renumbers those.
+
+    The store only keeps up to `stop_after` solutions per roll (see
+    `all_solutions` in qless_search), so a roll left with no stored
+    solutions may still have others that were never stored, unless its entry
+    has every grid tried.
+    """
+
+    def __init__(self, store, follow=True):
+        self.store = store
+        self.uses = {}
+        self.roll_words = {}
+        self.counts = {}
+        for roll in store:
+            self._add(roll)
+        if follow:
+            store.on_change = self.refresh
+
+    def _add(self, roll):
+        record = self.store.entries[roll]
+        used = {}
+        for k, (_, words) in enumerate(record['solutions']):
+            for w in set(words):
+                word = self.store.words[w]
+                used[word] = used.get(word, 0) | (1 << k)
+        for word, solutions in used.items():
+            self.uses.setdefault(word, {})[roll] = solutions
+        self.roll_words[roll] = list(used)
+        self.counts[roll] = len(record['solutions'])
+
+    def _remove(self, roll):
+        for word in self.roll_words.pop(roll, []):
+            rolls = self.uses[word]
+            del rolls[roll]
+            if len(rolls) == 0:
+                del self.uses[word]
+        self.counts.pop(roll, None)
+
+    def refresh(self, roll):
+        """Bring `roll` up to date with its entry in the store, or its removal."""
+        self._remove(roll)
+        if roll in self.store.entries:
+            self._add(roll)
+
+    def solutions_using(self, word):
+        """Get how many stored solutions of each roll use `word`, by roll."""
+        return {roll: bin(solutions).count("1")
+                for roll, solutions in self.uses.get(word, {}).items()}
+
+    def gated_rolls(self, words, rolls=None):
+        """
+        Get the rolls (of those in `rolls`, if given) that would have no
+        stored solutions left if all of `words` were rated below the
+        threshold: the rolls whose every stored solution uses one of them.
+        """
+        if isinstance(words, str):
+            words = [words]
+        lost = {}
+        for word in words:
+            for roll, solutions in self.uses.get(word, {}).items():
+                lost[roll] = lost.get(roll, 0) | solutions
+        return sorted([
+            roll for roll, solutions in lost.items()
+            if solutions == (1 << self.counts[roll]) - 1 and
+            (rolls is None or roll in rolls)
+        ])
+
+    def impact(self, word, rolls=None):
+        """
+        Get the number of rolls (of those in `rolls`, if given) that would
+        have no stored solutions left if `word` were rated below the
+        threshold.
+        """
+        return len(self.gated_rolls([word], rolls))
+
+    def ranked(self, words=None, rolls=None):
+        """
+        Get (word, impact) for each of `words` (by default, every word in a
+        stored solution), highest impact first.
+        """
+        if words is None:
+            words = self.uses
+        return sorted([(word, self.impact(word, rolls)) for word in words],
+                      key=lambda x: x[1], reverse=True)
+
+
+def load_candidate_rolls(path=CANDIDATES_PATH):
+    """Get the set of every roll in candidates.json."""
+    with open(path) as f:
+        return {roll for rolls in json.load(f).values() for roll in rolls}
+
+
+if __name__ == "__main__":
+    from qless_lexicon import load_lexicon
+
+    lexicon = load_lexicon()
+    index = WordImpactIndex(load_solution_store(), follow=False)
+    candidates = load_candidate_rolls()
+    unrated = [word for word in index.uses if lexicon.realness_of(word) == 5]
+    print("UNRATED WORD".ljust(16) + "CANDIDATES   ALL ROLLS")
+    for word, impact in index.ranked(unrated, candidates)[:25]:
+        print(f"{word:<16}{impact:>10}   {index.impact(word):>9}")
@@ -2,6 +2,38 @@ import { readFileSync } from "fs";
 
 const ROLLS_PATH = "src/lib/daily-qless/rolls.json";
 
+// In the compact format written by create_rolls_json.py, each day's legal words
+// are indices into a shared word table, stored as varint-encoded gaps in base64
+function decodeLegalWords(words: string[], encoded: string): string[] {
+  const bytes = Buffer.from(encoded, "base64");
+  const legalWords: string[] = [];
+  let index = 0;
+  let gap = 0;
+  let shift = 0;
+  for (const byte of bytes) {
+    gap += (byte & 0x7f) * 2 ** shift;
+    shift += 7;
+    if (byte < 0x80) {
+      index += gap;
+      legalWords.push(words[index]);
+      gap = 0;
+      shift = 0;
+    }
+  }
+  return legalWords;
+}
+
+function getRoll(rolls: any, date: Date): RollData {
+  const key = date.toISOString().substring(0, 10).replaceAll("-", "");
+  if (rolls.days === undefined) {
+    return rolls[key];
+  }
+  return {
+    roll: rolls.days[key].roll,
+    legalWords: decodeLegalWords(rolls.words, rolls.days[key].legalWords)
+  };
+}
+
 export function load(): QlessProps {
   // user can query for today or tomorrow, or if it's neither of those then give them yesterday
   const today = new Date();
@@ -12,9 +44,9 @@ export function load(): QlessProps {
   
   try {
     const rolls = JSON.parse(readFileSync(ROLLS_PATH).toString());
-    let roll1 = rolls[today.toISOString().substring(0, 10).replaceAll("-", "")];
-    let roll2 = rolls[tomorrow.toISOString().substring(0, 10).replaceAll("-", "")];
-    let roll3 = rolls[yesterday.toISOString().substring(0, 10).replaceAll("-", "")];
+    let roll1 = getRoll(rolls, today);
+    let roll2 = getRoll(rolls, tomorrow);
+    let roll3 = getRoll(rolls, yesterday);
     return {
       date1: today.getUTCDate(),
       roll1: roll1.roll,